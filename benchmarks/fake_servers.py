@@ -0,0 +1,248 @@
+""" Local stand-ins for an Okapi server and for the web hosts that records link to, for offline benchmarks. """
+import json
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+UUID_PATTERN = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+
+class QuietHandler(BaseHTTPRequestHandler):
+    """ Request handler that does not log each request to stderr. """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body=b'', content_type='text/plain', headers=None):
+        self.send_response(status)
+        self.send_header('content-type', content_type)
+        self.send_header('content-length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def send_json(self, value, status=200, headers=None):
+        self.send_body(status, json.dumps(value).encode('utf-8'), 'application/json', headers)
+
+    def read_json(self):
+        length = int(self.headers.get('content-length', 0))
+        return json.loads(self.rfile.read(length) or b'null')
+
+def start_server(handler_class):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def unused_port():
+    """ A port with nothing listening on it, so connections to it are refused. """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class HostProfile:
+    """ How one fake web host behaves. """
+
+    def __init__(self, latency=0.0, crawl_delay=None, failure_rate=0.0, rejects_head=False, disallow=None):
+        self.latency = latency
+        self.crawl_delay = crawl_delay
+        self.failure_rate = failure_rate
+        self.rejects_head = rejects_head
+        self.disallow = disallow
+
+    def robots_txt(self):
+        lines = ["User-agent: *"]
+        if self.disallow:
+            lines.append(f"Disallow: {self.disallow}")
+        if self.crawl_delay:
+            lines.append(f"Crawl-delay: {self.crawl_delay}")
+        return "\n".join(lines) + "\n"
+
+class HostFarm:
+    """ A set of local HTTP servers, one per fake host, plus hosts that refuse connections. """
+
+    def __init__(self, profiles, dead_hosts=0):
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._servers = [start_server(self._handler_class(profile)) for profile in profiles]
+        self.base_urls = [f"http://127.0.0.1:{server.server_address[1]}" for server in self._servers]
+        self.dead_base_urls = [f"http://127.0.0.1:{unused_port()}" for _ in range(dead_hosts)]
+
+    def _count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def _handler_class(self, profile):
+        farm = self
+
+        class HostHandler(QuietHandler):
+            def do_HEAD(self):
+                if profile.rejects_head and self.path != '/robots.txt':
+                    farm._count_request()
+                    self.send_body(405)
+                else:
+                    self.do_GET()
+
+            def do_GET(self):
+                farm._count_request()
+                if self.path == '/robots.txt':
+                    self.send_body(200, profile.robots_txt().encode('utf-8'))
+                    return
+                time.sleep(profile.latency)
+                kind, _, number = self.path.strip('/').partition('/')
+                if kind == 'moved':
+                    self.send_body(301, headers={'location': f'/item/{number}'})
+                # fail the same URLs on every request, so results are repeatable
+                elif random.Random(self.path).random() < profile.failure_rate:
+                    self.send_body(404)
+                else:
+                    self.send_body(200, b'x' * 4096, 'text/html')
+
+        return HostHandler
+
+    def close(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+
+class SyntheticCatalog:
+    """ Instances and their MARC source records, some with 856 links to the host farm. """
+
+    def __init__(self, record_count, base_urls, electronic_rate=0.3, linked_w_rate=0.05, suppressed_rate=0.02,
+            second_link_rate=0.2, redirect_rate=0.05, distinct_paths=None, seed=0):
+        rng = random.Random(seed)
+        distinct_paths = distinct_paths or record_count
+        self.instances = []
+        for number in range(record_count):
+            links = []
+            if rng.random() < electronic_rate:
+                for _ in range(2 if rng.random() < second_link_rate else 1):
+                    kind = 'moved' if rng.random() < redirect_rate else 'item'
+                    links.append(f"{rng.choice(base_urls)}/{kind}/{rng.randrange(distinct_paths)}")
+            self.instances.append({
+                'id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                'hrid': f"in{number:08d}",
+                'links': links,
+                'has_w': bool(links) and rng.random() < linked_w_rate,
+                'suppressed': rng.random() < suppressed_rate,
+            })
+        self._by_id = {instance['id']: instance for instance in self.instances}
+
+    def electronic_record_count(self):
+        return sum(1 for instance in self.instances if instance['links'] and not instance['has_w'] and not instance['suppressed'])
+
+    def link_count(self):
+        return sum(len(instance['links']) for instance in self.instances if not instance['has_w'] and not instance['suppressed'])
+
+    def srs_record(self, instance):
+        fields = [{'001': instance['hrid']}, {'245': {'ind1': '0', 'ind2': '0', 'subfields': [{'a': 'A title'}]}}]
+        for url in instance['links']:
+            subfields = [{'u': url}]
+            if instance['has_w']:
+                subfields.append({'w': '(OCoLC)1234'})
+            fields.append({'856': {'ind1': '4', 'ind2': '0', 'subfields': subfields}})
+        return {
+            'id': instance['id'],
+            'state': 'ACTUAL',
+            'externalIdsHolder': {'instanceId': instance['id'], 'instanceHrid': instance['hrid']},
+            'additionalInfo': {'suppressDiscovery': instance['suppressed']},
+            'parsedRecord': {'content': {'leader': '00000nam a2200000 a 4500', 'fields': fields}},
+        }
+
+    def inventory_instance(self, instance):
+        return {
+            'id': instance['id'],
+            'hrid': instance['hrid'],
+            'discoverySuppress': instance['suppressed'],
+            'electronicAccess': [{'uri': url} for url in instance['links']],
+        }
+
+    def ids_matching(self, expression, suppressed=None):
+        """ IDs of instances matching a fields search expression of 856 subfields being 'present' or 'absent'. """
+        conditions = re.findall(r"856\.(\w) is '(present|absent)'", expression)
+        ids = []
+        for instance in self.instances:
+            present = {'u': bool(instance['links']), 'w': instance['has_w']}
+            if all(present[subfield] == (state == 'present') for subfield, state in conditions) \
+                    and (suppressed is None or instance['suppressed'] == suppressed):
+                ids.append(instance['id'])
+        return ids
+
+    def instances_by_ids(self, ids):
+        return [self._by_id[id] for id in ids if id in self._by_id]
+
+class FakeOkapi:
+    """ A local server answering the FOLIO APIs used by the strategies, from a SyntheticCatalog. """
+
+    def __init__(self, catalog, latency=0.0):
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = start_server(self._handler_class(catalog, latency))
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def _count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def _handler_class(self, catalog, latency):
+        okapi = self
+
+        class OkapiHandler(QuietHandler):
+            def do_POST(self):
+                okapi._count_request()
+                path = urlparse(self.path).path
+                body = self.read_json()
+                if path.startswith('/authn/login'):
+                    token = 'benchmark-token'
+                    expiration = '2099-01-01T00:00:00Z'
+                    self.send_json({'okapiToken': token, 'accessTokenExpiration': expiration, 'refreshTokenExpiration': expiration},
+                        status=201, headers={'x-okapi-token': token, 'set-cookie': f'folioAccessToken={token}; Path=/'})
+                elif path == '/source-storage/stream/marc-record-identifiers':
+                    ids = catalog.ids_matching(body['fieldsSearchExpression'], body.get('suppressFromDiscovery'))
+                    offset = body.get('offset', 0)
+                    limit = body.get('limit', len(ids))
+                    self.send_json({'records': ids[offset : offset + limit], 'totalCount': len(ids)})
+                elif path == '/source-storage/source-records':
+                    time.sleep(latency)
+                    instances = catalog.instances_by_ids(body)
+                    self.send_json({'sourceRecords': [catalog.srs_record(instance) for instance in instances],
+                        'totalRecords': len(instances)})
+                elif path == '/instance-storage/instances/retrieve':
+                    time.sleep(latency)
+                    instances = catalog.instances_by_ids(UUID_PATTERN.findall(body['query']))
+                    self.send_json({'instances': [catalog.inventory_instance(instance) for instance in instances],
+                        'totalRecords': len(instances)})
+                else:
+                    self.send_json({'errors': [{'message': f'Unknown path {path}'}]}, status=404)
+
+            def do_GET(self):
+                okapi._count_request()
+                time.sleep(latency)
+                parsed = urlparse(self.path)
+                params = parse_qs(parsed.query)
+                if parsed.path == '/source-storage/records':
+                    offset = int(params.get('offset', ['0'])[0])
+                    limit = int(params.get('limit', ['10'])[0])
+                    page = catalog.instances[offset : offset + limit]
+                    self.send_json({'records': [catalog.srs_record(instance) for instance in page],
+                        'totalRecords': len(catalog.instances)})
+                elif parsed.path == '/inventory/instances':
+                    instances = catalog.instances_by_ids(UUID_PATTERN.findall(unquote(parsed.query)))
+                    self.send_json({'instances': [catalog.inventory_instance(instance) for instance in instances],
+                        'totalRecords': len(instances)})
+                else:
+                    self.send_json({'errors': [{'message': f'Unknown path {parsed.path}'}]}, status=404)
+
+        return OkapiHandler
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
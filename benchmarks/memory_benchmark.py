@@ -0,0 +1,78 @@
+""" Compare the memory used per record by ElectronicRecord and TestResult against their earlier __dict__-based layout.
+
+Usage: python3 -m benchmarks.memory_benchmark [--records N] [--distinct-urls N]
+"""
+import argparse
+import gc
+import tracemalloc
+
+from folio_bad_urls.data import ElectronicRecord, TestResult
+
+class DictElectronicLink:
+    """ ElectronicLink as it was before __slots__ and interning. """
+
+    def __init__(self, url, field, index):
+        self.url = url
+        self.field = field
+        self.index = index
+
+class DictElectronicRecord:
+    """ ElectronicRecord as it was before __slots__. """
+
+    def __init__(self, instance_hrid=None):
+        self.instance_hrid = instance_hrid
+        self.links = []
+
+    def add_link(self, url, field, index):
+        self.links.append(DictElectronicLink(url, field, index))
+
+class DictTestResult:
+    """ TestResult as it was before __slots__. """
+
+    def __init__(self, instance_hrid, url, status_code, permanent_redirect=None, link=None):
+        self.instance_hrid = instance_hrid
+        self.url = url
+        self.status_code = status_code
+        self.permanent_redirect = permanent_redirect
+        self.link = link
+
+def build(record_class, result_class, record_count, distinct_urls):
+    """ Build records and one result per link, as a batch would hold them. """
+    records = []
+    results = []
+    for number in range(record_count):
+        record = record_class(f"in{number:08d}")
+        # build a new string for each record, as parsing each FOLIO response does
+        url = "".join(["https://ebooks.example.com/title/", str(number % distinct_urls)])
+        record.add_link(url, '856', 0)
+        records.append(record)
+        for link in record.links:
+            results.append(result_class(record.instance_hrid, link.url, 200, link=link))
+    return records, results
+
+def measure(record_class, result_class, record_count, distinct_urls):
+    gc.collect()
+    tracemalloc.start()
+    records, results = build(record_class, result_class, record_count, distinct_urls)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records, results
+    return current, peak
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory per record for records and their results.")
+    parser.add_argument('--records', dest='records', type=int, default=1_000_000, help='Number of synthetic records.')
+    parser.add_argument('--distinct-urls', dest='distinct_urls', type=int, default=250_000,
+        help='Number of distinct URLs shared among the records.')
+    args = parser.parse_args()
+
+    print(f"{args.records} records, {args.distinct_urls} distinct URLs")
+    for label, record_class, result_class in [
+            ("before (__dict__)", DictElectronicRecord, DictTestResult),
+            ("after (__slots__, interned URLs)", ElectronicRecord, TestResult)]:
+        current, peak = measure(record_class, result_class, args.records, args.distinct_urls)
+        print(f"{label:34} {current / args.records:7.1f} bytes/record  "
+            f"total {current / 2**20:7.1f} MiB  peak {peak / 2**20:7.1f} MiB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+""" Measure FolioBadUrls.run throughput against a local fake Okapi and a farm of local web hosts.
+
+Usage: python3 -m benchmarks.offline_benchmark [--records N] [--hosts N] [--strategies ...]
+
+Requires the application's dependencies (requests, folioclient), but no network access.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from benchmarks.fake_servers import FakeOkapi, HostFarm, HostProfile, SyntheticCatalog
+from folio_bad_urls.main import FolioBadUrls
+
+STRATEGIES = {
+    'SrsStrategy': {'strategy': 'SrsStrategy'},
+    'SrsQueryStrategy': {'strategy': 'SrsQueryStrategy'},
+    'SrsInstanceIdsStrategy': {'strategy': 'SrsInstanceIdsStrategy', 'instance_lookup': 'get', 'query_limit': '25'},
+    'SrsInstanceIdsStrategy-retrieve': {'strategy': 'SrsInstanceIdsStrategy', 'instance_lookup': 'retrieve'},
+}
+
+CONFIG_TEMPLATE = """
+[Folio]
+okapi_url                   = {okapi_url}
+tenant_id                   = benchmark
+username                    = benchmark
+password                    = benchmark
+strategy                    = {strategy}
+query_limit                 = {query_limit}
+batch_limit                 = {batch_limit}
+instance_lookup             = {instance_lookup}
+
+[WebTester]
+default_crawl_delay         = {crawl_delay}
+max_crawl_delay             = 10
+request_timeout             = 2
+max_workers                 = {max_workers}
+
+[Reporter]
+output_file                 = result.csv
+
+[Logging]
+log_file                    = folio_bad_urls.log
+"""
+
+class PhaseTimer:
+    """ Total time spent in wrapped methods, summed across threads. """
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def wrap(self, obj, method_name, phase):
+        method = getattr(obj, method_name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.seconds[phase] += time.perf_counter() - start
+                    self.calls[phase] += 1
+
+        setattr(obj, method_name, timed)
+
+def run_app(values):
+    """ Run the application once in this process, returning its timings and peak memory. """
+    with tempfile.TemporaryDirectory() as work_dir:
+        previous_dir = os.getcwd()
+        # the application writes its checkpoint, instance IDs and report to the working directory
+        os.chdir(work_dir)
+        try:
+            with open('benchmark.properties', 'w') as file:
+                file.write(CONFIG_TEMPLATE.format(**values))
+
+            setup_start = time.perf_counter()
+            app = FolioBadUrls('benchmark.properties', False)
+            setup_seconds = time.perf_counter() - setup_start
+
+            timer = PhaseTimer()
+            timer.wrap(app.folio._strategy, 'load_electronic_records', 'FOLIO record loading')
+            timer.wrap(app.scheduler, 'test_records', 'URL testing (batch wall time)')
+            timer.wrap(app.web, '_load_crawl_rules', 'robots.txt loading')
+            timer.wrap(app.web, '_pause_if_needed', 'crawl delay pauses')
+            timer.wrap(app.web, '_request', 'HTTP requests')
+            timer.wrap(app.reporter, 'write_results', 'report writing')
+
+            run_start = time.perf_counter()
+            app.run(0, None)
+            run_seconds = time.perf_counter() - run_start
+        finally:
+            os.chdir(previous_dir)
+
+    return {
+        'setup_seconds': setup_seconds,
+        'run_seconds': run_seconds,
+        'phase_seconds': dict(timer.seconds),
+        'phase_calls': dict(timer.calls),
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def run_strategy(name, settings, args, catalog, okapi, farm):
+    values = {
+        'okapi_url': okapi.url,
+        'query_limit': args.query_limit,
+        'batch_limit': args.batch_limit,
+        'instance_lookup': 'get',
+        'crawl_delay': args.crawl_delay,
+        'max_workers': args.max_workers,
+    }
+    values.update(settings)
+
+    okapi_requests, host_requests = okapi.requests, farm.requests
+    # a fresh process for each strategy, so its peak memory and metrics are its own;
+    # the fake servers keep running in this process
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        stats = pool.apply(run_app, (values,))
+
+    run_seconds = stats['run_seconds']
+    records = catalog.electronic_record_count()
+    urls = farm.requests - host_requests
+    print(f"\n{name}")
+    print(f"  setup (login, instance IDs)   {stats['setup_seconds']:8.2f} s")
+    print(f"  run                           {run_seconds:8.2f} s")
+    print(f"  electronic records            {records:8d}   {records / run_seconds:10.1f} records/s")
+    print(f"  links                         {catalog.link_count():8d}")
+    print(f"  host requests                 {urls:8d}   {urls / run_seconds:10.1f} requests/s")
+    print(f"  FOLIO requests                {okapi.requests - okapi_requests:8d}")
+    print(f"  peak memory (RSS)             {stats['peak_rss_mib']:8.1f} MiB")
+    print("  time by phase, summed across threads:")
+    for phase, seconds in stats['phase_seconds'].items():
+        print(f"    {phase:32} {seconds:8.2f} s in {stats['phase_calls'][phase]} calls")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FolioBadUrls against a local fake FOLIO and fake web hosts.")
+    parser.add_argument('--records', type=int, default=5000, help='Number of instances in the synthetic catalog.')
+    parser.add_argument('--electronic-rate', type=float, default=0.3, help='Fraction of instances with 856 links.')
+    parser.add_argument('--hosts', type=int, default=20, help='Number of fake web hosts.')
+    parser.add_argument('--dead-hosts', type=int, default=2, help='Number of hosts that refuse connections.')
+    parser.add_argument('--host-latency', type=float, default=0.01, help='Seconds each host takes to respond.')
+    parser.add_argument('--robots-crawl-delay', type=float, default=None,
+        help='Crawl delay given in every host\'s robots.txt.  Default is none.')
+    parser.add_argument('--failure-rate', type=float, default=0.05, help='Fraction of URLs that return 404.')
+    parser.add_argument('--redirect-rate', type=float, default=0.05, help='Fraction of URLs that permanently redirect.')
+    parser.add_argument('--rejects-head-rate', type=float, default=0.2, help='Fraction of hosts that answer HEAD with 405.')
+    parser.add_argument('--okapi-latency', type=float, default=0.02, help='Seconds the fake Okapi takes per API call.')
+    parser.add_argument('--crawl-delay', type=float, default=0.05, help='default_crawl_delay for the application.')
+    parser.add_argument('--max-workers', type=int, default=10, help='max_workers for the application.')
+    parser.add_argument('--query-limit', type=int, default=100, help='query_limit for the application.')
+    parser.add_argument('--batch-limit', type=int, default=1000, help='batch_limit for the application.')
+    parser.add_argument('--strategies', nargs='+', default=list(STRATEGIES), choices=list(STRATEGIES))
+    args = parser.parse_args()
+
+    profiles = [HostProfile(latency=args.host_latency, crawl_delay=args.robots_crawl_delay, failure_rate=args.failure_rate,
+        rejects_head=index < args.hosts * args.rejects_head_rate) for index in range(args.hosts)]
+    farm = HostFarm(profiles, dead_hosts=args.dead_hosts)
+    catalog = SyntheticCatalog(args.records, farm.base_urls + farm.dead_base_urls,
+        electronic_rate=args.electronic_rate, redirect_rate=args.redirect_rate)
+    okapi = FakeOkapi(catalog, latency=args.okapi_latency)
+    print(f"{args.records} instances, {catalog.electronic_record_count()} electronic records, "
+        f"{args.hosts} hosts and {args.dead_hosts} dead hosts")
+    try:
+        for name in args.strategies:
+            run_strategy(name, STRATEGIES[name], args, catalog, okapi, farm)
+    finally:
+        okapi.close()
+        farm.close()
+
+if __name__ == '__main__':
+    main()
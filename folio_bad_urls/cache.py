@@ -0,0 +1,132 @@
+import logging
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+from folio_bad_urls.data import TestResult
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+# log.setLevel(logging.DEBUG)
+
+SECONDS_PER_DAY = 24 * 60 * 60
+# sharded runs share the cache file, so wait for other processes' writes
+SQLITE_TIMEOUT_SECONDS = 60
+
+def normalize_url(url):
+    """ Normalize a URL for use as a cache key: trim it, lowercase the scheme and host, and drop any fragment. """
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ''))
+
+class ResultCache:
+    """ Persist URL test results between runs, so that recently tested good URLs are not tested again. """
+
+    def __init__(self, config):
+        self._config = config
+        log.addHandler(self._config.log_file_handler)
+
+        self._CACHE_FILE = self._config.get('Cache', 'cache_file')
+        self._TTL = float(self._config.get('Cache', 'cache_ttl_days', fallback=7)) * SECONDS_PER_DAY
+
+        self._db = sqlite3.connect(self._CACHE_FILE, timeout=SQLITE_TIMEOUT_SECONDS)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                url TEXT PRIMARY KEY,
+                status_code INTEGER NOT NULL,
+                permanent_redirect TEXT,
+                checked_at REAL NOT NULL,
+                seen_at REAL NOT NULL
+            )""")
+        self._db.commit()
+        log.info(f"Using result cache {self._CACHE_FILE} with TTL of {self._TTL / SECONDS_PER_DAY} days.")
+
+    def get(self, url):
+        """ Return a cached result for the URL, or None if it was bad, is missing or is older than the TTL. """
+        row = self._db.execute(
+            "SELECT status_code, permanent_redirect, checked_at FROM results WHERE url = ?",
+            (normalize_url(url),)).fetchone()
+        if not row:
+            return None
+        status_code, permanent_redirect, checked_at = row
+        result = TestResult(None, url, status_code, permanent_redirect=permanent_redirect)
+        if result.is_bad_url() or time.time() - checked_at > self._TTL:
+            return None
+        return result
+
+    def put_all(self, results):
+        now = time.time()
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO results (url, status_code, permanent_redirect, checked_at, seen_at) VALUES (?, ?, ?, ?, ?)",
+                [(normalize_url(result.url), result.status_code, result.permanent_redirect, now, now) for result in results])
+
+    def mark_seen(self, urls):
+        """ Record that the URLs are still linked from FOLIO. """
+        now = time.time()
+        with self._db:
+            self._db.executemany(
+                "UPDATE results SET seen_at = ? WHERE url = ?",
+                [(now, normalize_url(url)) for url in urls])
+
+    def evict_unseen(self, run_started, owns=None):
+        """ Remove URLs not seen since the run started, a time in seconds.  Only call this after a run over all records.
+
+        If owns is given, only URLs for which owns(url) is true are removed, such as those of a shard's hosts.
+        """
+        with self._db:
+            if owns:
+                self._db.create_function('owns', 1, owns, deterministic=True)
+                evicted = self._db.execute("DELETE FROM results WHERE seen_at < ? AND owns(url)", (run_started,)).rowcount
+            else:
+                evicted = self._db.execute("DELETE FROM results WHERE seen_at < ?", (run_started,)).rowcount
+        log.info(f"Evicted {evicted} URLs no longer present in FOLIO from the result cache.")
+
+    def close(self):
+        self._db.close()
+
+class RobotsCache:
+    """ Persist robots.txt responses between runs, so that each host's rules are not fetched on every run. """
+
+    def __init__(self, config):
+        self._config = config
+        log.addHandler(self._config.log_file_handler)
+
+        self._CACHE_FILE = self._config.get('Cache', 'cache_file')
+        self._TTL = float(self._config.get('Cache', 'robots_ttl_days', fallback=1)) * SECONDS_PER_DAY
+
+        # robots.txt may be fetched lazily from a worker thread
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self._CACHE_FILE, timeout=SQLITE_TIMEOUT_SECONDS, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS robots (
+                base_url TEXT PRIMARY KEY,
+                status_code INTEGER NOT NULL,
+                body TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )""")
+        self._db.commit()
+
+    def get(self, base_url):
+        """ Return the cached (status_code, body) of the host's robots.txt, or None if missing or expired. """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status_code, body, fetched_at FROM robots WHERE base_url = ?",
+                (base_url.lower(),)).fetchone()
+        if not row or time.time() - row[2] > self._TTL:
+            return None
+        return row[0], row[1]
+
+    def put(self, base_url, status_code, body):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO robots (base_url, status_code, body, fetched_at) VALUES (?, ?, ?, ?)",
+                (base_url.lower(), status_code, body, time.time()))
+
+    def evict_expired(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM robots WHERE fetched_at < ?", (time.time() - self._TTL,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+import threading
+import time
+from os.path import exists
+
+from folio_bad_urls.data import TestResult
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+# log.setLevel(logging.DEBUG)
+
+CHECKPOINT_FILENAME = 'checkpoint.json'
+SAVE_INTERVAL_SECONDS = 30
+
+class Checkpoint:
+    """ Track the progress of a run in a file, so that an interrupted run can be resumed. """
+
+    def __init__(self, config, shard=None):
+        self._config = config
+        log.addHandler(self._config.log_file_handler)
+        self._filename = shard.filename(CHECKPOINT_FILENAME) if shard else CHECKPOINT_FILENAME
+        self._lock = threading.Lock()
+        self._last_saved = 0
+
+        self.start_offset = 0
+        self.end_offset = None
+        # when the run first started, kept when it is resumed
+        self.run_started = None
+        # whether the run checks only records updated since updated_since, or None if not saved
+        self.delta_run = None
+        self.updated_since = None
+        self.completed_offsets = []
+        self.total_bad_urls = 0
+        # results of URLs tested within the current, incomplete batch
+        self.batch_results = dict()
+
+    def start(self, start_offset, end_offset, run_started, delta_run=False, updated_since=None):
+        self.start_offset = start_offset
+        self.end_offset = end_offset
+        self.run_started = run_started
+        self.delta_run = delta_run
+        self.updated_since = updated_since
+        self.save()
+
+    def load(self):
+        if not exists(self._filename):
+            raise FileNotFoundError(f"Cannot resume, no checkpoint file found: {self._filename}")
+        with open(self._filename) as file:
+            state = json.load(file)
+        self.start_offset = state['start_offset']
+        self.end_offset = state['end_offset']
+        self.run_started = state.get('run_started')
+        self.delta_run = state.get('delta_run')
+        self.updated_since = state.get('updated_since')
+        self.completed_offsets = state['completed_offsets']
+        self.total_bad_urls = state['total_bad_urls']
+        self.batch_results = {url: self._decode_result(url, value) for url, value in state['batch_results'].items()}
+        log.info(f"Resuming from offset {self.next_offset()} with {len(self.completed_offsets)} completed batches "
+            f"and {len(self.batch_results)} URLs already tested in the current batch.")
+
+    def next_offset(self):
+        """ The offset of the first batch not yet completed. """
+        if not self.completed_offsets:
+            return self.start_offset
+        # batches are completed in order
+        return max(self.completed_offsets) + int(self._config.get('Folio', 'batch_limit'))
+
+    def record_result(self, url, result):
+        """ Record a URL tested within the current batch, saving the checkpoint periodically.  Thread-safe. """
+        with self._lock:
+            self.batch_results[url] = result
+        if time.time() - self._last_saved > SAVE_INTERVAL_SECONDS:
+            self.save()
+
+    def complete_batch(self, offset, bad_urls):
+        with self._lock:
+            self.completed_offsets.append(offset)
+            self.total_bad_urls += bad_urls
+            self.batch_results = dict()
+        self.save()
+
+    def save(self):
+        with self._lock:
+            state = {
+                'start_offset': self.start_offset,
+                'end_offset': self.end_offset,
+                'run_started': self.run_started,
+                'delta_run': self.delta_run,
+                'updated_since': self.updated_since,
+                'completed_offsets': self.completed_offsets,
+                'total_bad_urls': self.total_bad_urls,
+                'batch_results': {url: self._encode_result(result) for url, result in self.batch_results.items()},
+            }
+            # write then rename, so a crash while saving leaves the previous checkpoint intact
+            temp_filename = self._filename + '.tmp'
+            with open(temp_filename, 'w') as file:
+                json.dump(state, file)
+            os.replace(temp_filename, self._filename)
+            self._last_saved = time.time()
+
+    def delete(self):
+        if exists(self._filename):
+            os.remove(self._filename)
+
+    def _encode_result(self, result):
+        if not result:
+            return None
+        return [result.status_code, result.permanent_redirect]
+
+    def _decode_result(self, url, value):
+        if not value:
+            return None
+        status_code, permanent_redirect = value
+        return TestResult(None, url, status_code, permanent_redirect=permanent_redirect)
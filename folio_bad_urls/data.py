@@ -1,20 +1,50 @@
+import sys
+
+# Records and results are held for whole batches, or whole runs when URLs are deduplicated, so they use
+# __slots__ rather than a per-instance __dict__, and URLs shared by many records are interned.
+
+def _slots_repr(obj):
+    return str({slot: getattr(obj, slot) for slot in obj.__slots__})
+
+class ElectronicLink:
+    """ A URL within a record, with the field it came from and that field's index within the record. """
+
+    __slots__ = ('url', 'field', 'index')
+
+    def __init__(self, url, field, index):
+        self.url = sys.intern(url)
+        self.field = field
+        self.index = index
+
+    def __repr__(self):
+        return _slots_repr(self)
+
 class ElectronicRecord:
-    """ A record with a URL. """
+    """ A record with one or more URLs. """
+
+    __slots__ = ('instance_hrid', 'links')
+
+    def __init__(self, instance_hrid=None):
+        self.instance_hrid = instance_hrid
+        self.links = []
 
-    instance_hrid = None
-    url = None
+    def add_link(self, url, field, index):
+        self.links.append(ElectronicLink(url, field, index))
 
     def __repr__(self):
-        return str(self.__dict__)
+        return _slots_repr(self)
 
 class TestResult:
     """ The result of testing a URL from a record. """ 
 
-    def __init__(self, instance_hrid, url, status_code, permanent_redirect=None):
+    __slots__ = ('instance_hrid', 'url', 'status_code', 'permanent_redirect', 'link')
+
+    def __init__(self, instance_hrid, url, status_code, permanent_redirect=None, link=None):
         self.instance_hrid = instance_hrid
         self.url = url
         self.status_code = status_code
         self.permanent_redirect = permanent_redirect
+        self.link = link
 
     def is_insecure_url(self):
         return not self.url.startswith("https:")
@@ -22,10 +52,15 @@ class TestResult:
     def is_bad_url(self):
         return self.status_code != 200
 
+    def for_record(self, instance_hrid, link=None):
+        """ Copy this result for another record or link with the same URL. """
+        return TestResult(instance_hrid, self.url, self.status_code, permanent_redirect=self.permanent_redirect, link=link)
+
     def __repr__(self):
-        return str(self.__dict__)
+        return _slots_repr(self)
 
 class LocalStatusCode:
     CONNECTION_FAILED               = 0
     ROBOTS_TXT_BLOCKS_URL           = -10
     ROBOTS_TXT_TIMEOUT_EXCESSIVE    = -11
+    HOST_CIRCUIT_OPEN               = -20
@@ -0,0 +1,112 @@
+import logging
+from urllib.parse import urlparse
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+# log.setLevel(logging.DEBUG)
+
+EXACT_HOST_PREFIX = 'domain:'
+WILDCARD_HOST_PREFIX = '*.'
+# marks the end of a complete domain in the host suffix trie
+_END = ''
+# up to this many substring patterns, checking each one in turn is faster than looking them up in an index
+LINEAR_SCAN_LIMIT = 150
+# longest prefix of the substring patterns used to index them
+MAX_KEY_LENGTH = 8
+
+class PatternMatcher:
+    """ A list of URL patterns compiled once for matching many URLs.
+
+    Patterns are substrings of the URL, except for domain:example.com, which matches that host exactly, and
+    *.example.com, which matches any subdomain of example.com.
+    """
+
+    def __init__(self, patterns):
+        self._exact_hosts = set()
+        self._host_suffixes = dict()
+        substrings = []
+        for pattern in patterns:
+            if pattern.startswith(EXACT_HOST_PREFIX):
+                self._exact_hosts.add(pattern[len(EXACT_HOST_PREFIX):].lower())
+            elif pattern.startswith(WILDCARD_HOST_PREFIX):
+                self._add_host_suffix(pattern[len(WILDCARD_HOST_PREFIX):].lower())
+            else:
+                substrings.append(pattern)
+        # index many substrings by a prefix of the same length, so a URL is checked against only the patterns
+        # sharing a prefix with one of its own substrings, rather than against every pattern
+        self._substrings = substrings
+        self._substring_index = None
+        if len(substrings) > LINEAR_SCAN_LIMIT:
+            self._key_length = min([MAX_KEY_LENGTH] + [len(value) for value in substrings])
+            self._substring_index = dict()
+            for value in substrings:
+                self._substring_index.setdefault(value[:self._key_length], []).append(value)
+
+    def _add_host_suffix(self, domain):
+        node = self._host_suffixes
+        for label in reversed(domain.split('.')):
+            node = node.setdefault(label, dict())
+        node[_END] = True
+
+    def matches(self, url):
+        if self._substrings and self._matches_substring(url):
+            return True
+        if self._exact_hosts or self._host_suffixes:
+            host = (urlparse(url).hostname or '').lower()
+            return host in self._exact_hosts or self._matches_host_suffix(host)
+        return False
+
+    def _matches_substring(self, url):
+        if self._substring_index is None:
+            return any(value in url for value in self._substrings)
+        length = self._key_length
+        keys = {url[index : index + length] for index in range(len(url) - length + 1)}
+        for key in keys & self._substring_index.keys():
+            if any(value in url for value in self._substring_index[key]):
+                return True
+        return False
+
+    def _matches_host_suffix(self, host):
+        node = self._host_suffixes
+        labels = host.split('.')
+        # a wildcard domain matches only hosts with at least one more label in front of it
+        for label in reversed(labels[1:]):
+            node = node.get(label)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+        return False
+
+class UrlFilter:
+    """ Decide which URLs to test from the configured allow and block lists. """
+
+    def __init__(self, config):
+        self._config = config
+        log.addHandler(self._config.log_file_handler)
+        self._allow_list = self._block_list = None
+
+        allow_list_string = self._config.get('WebTester', 'allow_list', fallback=None)
+        if allow_list_string:
+            patterns = [val.strip() for val in allow_list_string.split(',')]
+            self._allow_list = PatternMatcher(patterns)
+            log.info(f"Using allow list: {patterns}")
+
+        if not self._allow_list:
+            block_list_string = self._config.get('WebTester', 'block_list', fallback=None)
+            if block_list_string:
+                patterns = [val.strip() for val in block_list_string.split(',')]
+                self._block_list = PatternMatcher(patterns)
+                log.info(f"Using block list: {patterns}")
+
+    def allows(self, url):
+        # check allow list
+        if self._allow_list:
+            return self._allow_list.matches(url)
+
+        # check block list
+        elif self._block_list:
+            return not self._block_list.matches(url)
+
+        # allow URL if it's in neither list
+        return True
@@ -1,16 +1,43 @@
 import requests
 import json
+import logging
+from requests.adapters import HTTPAdapter
 
 from folioclient.FolioClient import FolioClient as OriginalFolioClient
 
+from folio_bad_urls.metrics import metrics
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+# log.setLevel(logging.DEBUG)
+
 class FolioClient(OriginalFolioClient):
-    """ Extend original library to add POST support. """
+    """ Extend original library to add POST support and a connection pool shared by concurrent requests. """
+
+    def __init__(self, *args, pool_size=10, timeout=60, **kwargs):
+        super().__init__(*args, **kwargs)
+        # every request has a timeout, so a stalled response cannot hang the record loading thread
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def folio_get(self, path, key=None, query=""):
+        """Fetches data from FOLIO and turns it into a json object"""
+        url = self.okapi_url + path + query
+        with metrics.timer('folio_request_seconds'):
+            req = self.session.get(url, headers=self.okapi_headers, timeout=self.timeout, verify=self.ssl_verify)
+        req.raise_for_status()
+        return json.loads(req.text)[key] if key else json.loads(req.text)
 
     def folio_post(self, path, key=None, data=""):
         """Fetches data from FOLIO and turns it into a json object"""
         url = self.okapi_url + path
-        print("POSTing to FOLIO: " + url)
-        req = requests.post(url, headers=self.okapi_headers, data=json.dumps(data))
+        log.debug(f"POSTing to FOLIO: {url}")
+        with metrics.timer('folio_request_seconds'):
+            req = self.session.post(url, headers=self.okapi_headers, data=json.dumps(data),
+                timeout=self.timeout, verify=self.ssl_verify)
         if req.status_code == 200:
             return json.loads(req.text)[key] if key else json.loads(req.text)
         elif req.status_code == 422:
@@ -20,3 +47,13 @@ class FolioClient(OriginalFolioClient):
         else:
             raise Exception(f"HTTP {req.status_code}\n{req.text}")
 
+    def folio_post_stream(self, path, data=""):
+        """POSTs to FOLIO and yields the response body as decoded text chunks, without holding it all in memory"""
+        url = self.okapi_url + path
+        log.debug(f"POSTing to FOLIO: {url}")
+        with self.session.post(url, headers=self.okapi_headers, data=json.dumps(data), stream=True,
+                timeout=self.timeout, verify=self.ssl_verify) as req:
+            if req.status_code != 200:
+                raise Exception(f"HTTP {req.status_code}\n{req.text}")
+            req.encoding = req.encoding or 'utf-8'
+            yield from req.iter_content(chunk_size=64 * 1024, decode_unicode=True)
@@ -0,0 +1,69 @@
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from os.path import exists
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+# log.setLevel(logging.DEBUG)
+
+DELTA_STATE_FILENAME = 'delta_state.json'
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+class DeltaState:
+    """ Track when runs happened, so that a delta run only checks records changed since the last run. """
+
+    def __init__(self, config):
+        self._config = config
+        log.addHandler(self._config.log_file_handler)
+        self._FULL_RUN_DAYS = float(self._config.get('Folio', 'delta_full_run_days', fallback=7))
+
+        self._run_started = datetime.now(timezone.utc)
+        self._resumed_delta_run = None
+        self.watermark = None
+        self.last_full_run = None
+        if exists(DELTA_STATE_FILENAME):
+            with open(DELTA_STATE_FILENAME) as file:
+                state = json.load(file)
+            self.watermark = self._parse(state.get('watermark'))
+            self.last_full_run = self._parse(state.get('last_full_run'))
+
+    def resume(self, delta_run, updated_since):
+        """ Continue a run in the mode, and from the watermark, it started with, regardless of the time since. """
+        self._resumed_delta_run = delta_run
+        if updated_since:
+            self.watermark = self._parse(updated_since)
+
+    def is_delta_run(self):
+        """ Whether this run can check only changed records, or is due for a full run over all records. """
+        if self._resumed_delta_run is not None:
+            return self._resumed_delta_run
+        if not self.watermark or not self.last_full_run:
+            return False
+        return self._run_started - self.last_full_run < timedelta(days=self._FULL_RUN_DAYS)
+
+    def updated_since(self):
+        return self.watermark.strftime(TIMESTAMP_FORMAT)
+
+    def complete_run(self, full_run, run_started=None):
+        """ Save this run's start, in seconds if given, as the watermark for the next delta run. """
+        # a resumed run started when it was first started, not when this process did
+        started = datetime.fromtimestamp(run_started, timezone.utc) if run_started else self._run_started
+        self.watermark = started
+        if full_run:
+            self.last_full_run = started
+        state = {
+            'watermark': self.watermark.strftime(TIMESTAMP_FORMAT),
+            'last_full_run': self.last_full_run.strftime(TIMESTAMP_FORMAT) if self.last_full_run else None,
+        }
+        temp_filename = DELTA_STATE_FILENAME + '.tmp'
+        with open(temp_filename, 'w') as file:
+            json.dump(state, file)
+        os.replace(temp_filename, DELTA_STATE_FILENAME)
+        log.info(f"Saved delta watermark {state['watermark']}.")
+
+    def _parse(self, value):
+        if not value:
+            return None
+        return datetime.strptime(value, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
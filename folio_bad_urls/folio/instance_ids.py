@@ -0,0 +1,108 @@
+import heapq
+import logging
+import mmap
+import os
+import re
+import uuid
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+# log.setLevel(logging.DEBUG)
+
+UUID_BYTES = 16
+UUID_PATTERN = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+# longest text that may hold an incomplete UUID at the end of a chunk
+UUID_LENGTH = 36
+
+def parse_uuids(chunks):
+    """ Yield each UUID found in a stream of text chunks, such as a streamed JSON response of record identifiers. """
+    tail = ''
+    for chunk in chunks:
+        text = tail + chunk
+        end = 0
+        for match in UUID_PATTERN.finditer(text):
+            # a match running to the end of the text may be cut off; carry it over to the next chunk
+            if match.end() == len(text):
+                break
+            yield match.group()
+            end = match.end()
+        tail = text[max(end, len(text) - UUID_LENGTH):]
+    for match in UUID_PATTERN.finditer(tail):
+        yield match.group()
+
+def sorted_uuid_bytes(uuids):
+    """ Pack UUID strings into one bytes object of sorted, unique 16-byte UUIDs. """
+    packed = sorted({uuid.UUID(value).bytes for value in uuids})
+    return b''.join(packed)
+
+def write_difference(filename, ids, excluded_ids):
+    """ Write the packed UUIDs in ids but not in excluded_ids to a file.  Both must be sorted, as by sorted_uuid_bytes. """
+    return _write(filename, _difference(_iter_packed(ids), _iter_packed(excluded_ids)))
+
+def write_merge(filename, ids, added_ids, removed_ids):
+    """ Write the packed UUIDs in ids or added_ids, and not in removed_ids, to a file.  All must be sorted. """
+    remaining = _difference(_iter_packed(ids), _iter_packed(removed_ids))
+    return _write(filename, _unique(heapq.merge(remaining, _iter_packed(added_ids))))
+
+def _iter_packed(ids):
+    for index in range(0, len(ids), UUID_BYTES):
+        yield bytes(ids[index : index + UUID_BYTES])
+
+def _difference(values, excluded_values):
+    excluded = next(excluded_values, None)
+    for value in values:
+        while excluded is not None and excluded < value:
+            excluded = next(excluded_values, None)
+        if value != excluded:
+            yield value
+
+def _unique(values):
+    previous = None
+    for value in values:
+        if value != previous:
+            yield value
+        previous = value
+
+def _write(filename, values):
+    count = 0
+    # write then rename, so an interrupted write does not leave a partial list to be reused
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'wb') as file:
+        for value in values:
+            file.write(value)
+            count += 1
+    os.replace(temp_filename, filename)
+    return count
+
+class InstanceIds:
+    """ A sorted list of instance IDs stored as 16-byte UUIDs in a memory-mapped file. """
+
+    def __init__(self, filename):
+        self._file = open(filename, 'rb')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._ids = b''
+        else:
+            self._ids = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def packed(self):
+        """ The sorted 16-byte UUIDs, as accepted by write_difference and write_merge. """
+        return self._ids
+
+    def __len__(self):
+        return len(self._ids) // UUID_BYTES
+
+    def __getitem__(self, key):
+        """ Return the UUID string at an index, or a list of UUID strings for a slice. """
+        if isinstance(key, slice):
+            return [self[index] for index in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError(key)
+        start = key * UUID_BYTES
+        return str(uuid.UUID(bytes=bytes(self._ids[start : start + UUID_BYTES])))
+
+    def close(self):
+        if isinstance(self._ids, mmap.mmap):
+            self._ids.close()
+        self._file.close()
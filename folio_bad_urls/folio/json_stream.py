@@ -0,0 +1,34 @@
+import json
+import re
+
+SEPARATOR_PATTERN = re.compile(r'[\s,]*')
+
+def iter_array_items(chunks, key):
+    """ Yield each item of the array under key in a JSON object read as a stream of text chunks.
+
+    Each item is parsed once it has been fully received, so a large response is never held in memory at once.
+    """
+    decoder = json.JSONDecoder()
+    start_pattern = re.compile(r'"' + re.escape(key) + r'"\s*:\s*\[')
+    buffer = ''
+    position = None
+    for chunk in chunks:
+        buffer += chunk
+        if position is None:
+            match = start_pattern.search(buffer)
+            if not match:
+                continue
+            position = match.end()
+        while True:
+            position = SEPARATOR_PATTERN.match(buffer, position).end()
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # the item is incomplete; wait for the next chunk
+                break
+            yield item
+        buffer = buffer[position:]
+        position = 0
+    raise Exception(f"Incomplete JSON response, no end of array {key}")
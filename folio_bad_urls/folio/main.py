@@ -1,6 +1,11 @@
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from folio_bad_urls.folio.client import FolioClient
+from folio_bad_urls.folio.delta import DeltaState
+from folio_bad_urls.filters import UrlFilter
+from folio_bad_urls.pipeline import prefetch
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
@@ -9,23 +14,50 @@ log.setLevel(logging.INFO)
 class Folio:
     """ Get ElectronicRecords via the FOLIO API. """
 
-    def __init__(self, config, reuse_instance_ids):
+    def __init__(self, config, reuse_instance_ids, checkpoint=None):
         self._config = config
         log.addHandler(self._config.log_file_handler)
+        # before any records or instance IDs are queried, so changes made while they are cannot be missed
+        self._started = time.time()
+        self._concurrent_requests = int(self._config.get("Folio", "concurrent_requests", fallback=4))
+        self._executor = ThreadPoolExecutor(max_workers=self._concurrent_requests)
         self.connection = self._init_connection()
+        # applied while parsing records, so skipped URLs never become links to test
+        self.url_filter = UrlFilter(self._config)
+
+        self._delta_state = None
+        # a resumed run must load the same records it started with, so it keeps its mode even if a full run is now due
+        resumed_delta_run = checkpoint.delta_run if checkpoint else None
+        if self._config.getboolean('Folio', 'delta_mode', fallback=False):
+            self._delta_state = DeltaState(self._config)
+            if resumed_delta_run is not None:
+                self._delta_state.resume(resumed_delta_run, checkpoint.updated_since)
+            # a delta run merges its changes into the saved instance IDs rather than regenerating them
+            reuse_instance_ids = reuse_instance_ids or self._delta_state.is_delta_run()
+        elif resumed_delta_run:
+            raise Exception("Cannot resume a delta run without delta_mode.")
 
         strategy = self._config.get('Folio', 'strategy')
         if strategy == "SrsStrategy":
             from folio_bad_urls.folio.srs_strategy import SrsStrategy
             self._strategy = SrsStrategy(self)
+        elif strategy == "SrsQueryStrategy":
+            from folio_bad_urls.folio.srs_query_strategy import SrsQueryStrategy
+            self._strategy = SrsQueryStrategy(self)
         elif strategy == "SrsInstanceIdsStrategy":
             from folio_bad_urls.folio.srs_instance_ids_strategy import SrsInstanceIdsStrategy
             self._strategy = SrsInstanceIdsStrategy(self, reuse_instance_ids)
         else:
             raise Exception(f"Unknown strategy: {strategy}")
 
+        if self.is_delta_run():
+            from folio_bad_urls.folio.srs_delta_strategy import SrsDeltaStrategy
+            log.info(f"Delta run: checking records updated since {self._delta_state.updated_since()}")
+            self._strategy = SrsDeltaStrategy(self, self._delta_state.updated_since(), self._strategy)
+
         self._query_limit = int(self._config.get("Folio", "query_limit"))
         self._batch_limit = int(self._config.get("Folio", "batch_limit"))
+        self._prefetch_batches = int(self._config.get("Folio", "prefetch_batches", fallback=1))
 
     def _init_connection(self):
         log.debug("Connecting to FOLIO")
@@ -33,11 +65,43 @@ class Folio:
             okapi_url = self._config.get('Folio', 'okapi_url'),
             tenant_id = self._config.get('Folio', 'tenant_id'),
             username = self._config.get('Folio', 'username'),
-            password = self._config.get('Folio', 'password')
+            password = self._config.get('Folio', 'password'),
+            pool_size = self._concurrent_requests,
+            timeout = float(self._config.get('Folio', 'request_timeout', fallback=60))
         )
 
+    def map_concurrent(self, function, items):
+        """ Call function on each item with up to concurrent_requests FOLIO calls at once, returning results in order. """
+        return list(self._executor.map(function, items))
+
+    def is_delta_run(self):
+        return self._delta_state is not None and self._delta_state.is_delta_run()
+
+    def run_started(self):
+        """ The time in seconds from which this run's records are up to date: when it started, or earlier if it reuses saved instance IDs. """
+        snapshot_time = self._strategy.snapshot_time()
+        return min(self._started, snapshot_time) if snapshot_time else self._started
+
+    def updated_since(self):
+        """ The watermark of a delta run, or None for a full run. """
+        return self._delta_state.updated_since() if self.is_delta_run() else None
+
+    def complete_run(self, all_records, run_started=None):
+        """ Record a completed run.  all_records is whether it covered every record, rather than an offset range. """
+        # a run over an offset range leaves the records after it unchecked, so it must not move the watermark
+        if not self._delta_state or not all_records:
+            return
+        if self.is_delta_run():
+            self._strategy.complete_run(run_started)
+        self._delta_state.complete_run(full_run = not self.is_delta_run(), run_started = run_started)
+
     def get_total_records(self):
         return self._strategy.get_total_records()
 
     def load_electronic_records(self, offset):
         return self._strategy.load_electronic_records(offset)
+
+    def iter_electronic_records(self, start_offset, end_offset):
+        """ Yield (offset, records) for each batch, loading the next batches from FOLIO while the current one is tested. """
+        batches = self._strategy.iter_electronic_records(start_offset, end_offset)
+        return prefetch(batches, self._prefetch_batches)
@@ -0,0 +1,64 @@
+import logging
+
+from folio_bad_urls.folio.srs_strategy import SrsStrategy
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+# log.setLevel(logging.DEBUG)
+
+class SrsDeltaStrategy(SrsStrategy):
+    """ Discover records with electronic resource links among SRS records updated since the last run. """
+
+    def __init__(self, folio, updated_since, strategy):
+        super().__init__(folio)
+        log.addHandler(folio._config.log_file_handler)
+        self._updated_since = updated_since
+        # the configured strategy, updated with the changes once all changed records are loaded
+        self._strategy = strategy
+        self._added_instance_ids = set()
+        self._removed_instance_ids = set()
+        # whether this process loaded every changed record, so the changes above are complete
+        self._loaded_all_changes = False
+
+    def iter_electronic_records(self, start_offset, end_offset):
+        yield from super().iter_electronic_records(start_offset, end_offset)
+        self._loaded_all_changes = start_offset == 0 and not end_offset
+
+    def complete_run(self, run_started):
+        """ Update the configured strategy with the changes, after a run over every changed record started at run_started. """
+        if not hasattr(self._strategy, 'update_instance_ids'):
+            return
+        if self._loaded_all_changes:
+            self._strategy.update_instance_ids(self._added_instance_ids, self._removed_instance_ids, run_started)
+        else:
+            # a resumed run saw only the changes after its checkpoint, so the saved IDs must be generated again
+            self._strategy.discard_instance_ids()
+
+    def _get_srs_records(self, offset, limit = None):
+        if not limit:
+            limit = self.folio._query_limit
+
+        result = self._api_query_srs_records(offset, limit)
+        return result['sourceRecords']
+
+    def _api_query_srs_records(self, offset, limit = None):
+        path = "/source-storage/source-records"
+        params = f'?recordType=MARC_BIB&updatedAfter={self._updated_since}&offset={offset}&limit={limit}'
+        return self.folio.client.folio_get(path, query = params)
+
+    def _parse_record(self, srs_record):
+        record = super()._parse_record(srs_record)
+        instance_id = srs_record['externalIdsHolder'].get('instanceId') if srs_record['externalIdsHolder'] else None
+        if instance_id:
+            # match how the saved instance IDs are selected, regardless of suppression or URL filters
+            if self._has_subfield(srs_record, '856', 'u') and not self._has_subfield(srs_record, '856', 'w'):
+                self._added_instance_ids.add(instance_id)
+            else:
+                self._removed_instance_ids.add(instance_id)
+        return record
+
+    def _has_subfield(self, srs_record, tag, code):
+        for field in srs_record['parsedRecord']['content']['fields']:
+            if tag in field and any(code in subfield for subfield in field[tag]['subfields']):
+                return True
+        return False
@@ -1,16 +1,17 @@
 import logging
-import json
 import os
+import time
 from os.path import exists
 
 from folio_bad_urls.folio.strategy import Strategy
+from folio_bad_urls.folio.instance_ids import InstanceIds, UUID_BYTES, parse_uuids, sorted_uuid_bytes, write_difference, write_merge
 from folio_bad_urls.data import ElectronicRecord
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
 # log.setLevel(logging.DEBUG)
 
-INSTANCE_IDS_FILENAME = f'instance_ids.json'
+INSTANCE_IDS_FILENAME = 'instance_ids.bin'
 
 class SrsInstanceIdsStrategy(Strategy):
     """ Discover records with electronic resource links via querying SRS for instnance IDs and then inventory. """ 
@@ -18,6 +19,9 @@ class SrsInstanceIdsStrategy(Strategy):
     def __init__(self, folio, reuse_instance_ids):
         super().__init__(folio)
         log.addHandler(folio._config.log_file_handler)
+        self._instance_lookup = folio._config.get('Folio', 'instance_lookup', fallback='get')
+        if self._instance_lookup not in ('get', 'retrieve'):
+            raise Exception(f"Unknown instance_lookup: {self._instance_lookup}")
         if not reuse_instance_ids:
             self._delete_instance_ids()
         self._load_instance_ids()
@@ -28,58 +32,71 @@ class SrsInstanceIdsStrategy(Strategy):
             os.remove(INSTANCE_IDS_FILENAME)
 
     def _load_instance_ids(self):
-        # check file storage
-        if exists(INSTANCE_IDS_FILENAME):
-            with open(INSTANCE_IDS_FILENAME) as file:
-                ids = json.load(file)
-                log.debug(f"loaded {len(ids)} ids")
+        # generate unless already in file storage
+        if not exists(INSTANCE_IDS_FILENAME):
+            started = time.time()
+            ids_with_856_u = sorted_uuid_bytes(self._get_ids_with_field('856', 'u'))
+            log.debug(f"{len(ids_with_856_u) // UUID_BYTES} IDs with 856$u")
+            ids_with_856_w = sorted_uuid_bytes(self._get_ids_with_field('856', 'w'))
+            log.debug(f"{len(ids_with_856_w) // UUID_BYTES} IDs with 856$w")
+            count = write_difference(INSTANCE_IDS_FILENAME, ids_with_856_u, ids_with_856_w)
+            log.debug(f"filtered ids: {count}")
+            # the IDs are as of when the queries started, so instances changed while they ran may be missing
+            os.utime(INSTANCE_IDS_FILENAME, (started, started))
+
+        self._instance_ids = InstanceIds(INSTANCE_IDS_FILENAME)
+        log.info(f"Loaded {len(self._instance_ids)} IDs.")
 
-        # else generate
-        else:
-            ids_with_856_u = self._get_ids_with_field('856', 'u')
-            log.debug(f"{len(ids_with_856_u)} IDs with 856$u")
-            ids_with_856_w = self._get_ids_with_field('856', 'w')
-            log.debug(f"{len(ids_with_856_w)} IDs with 856$w")
-            ids = set(ids_with_856_u) - set(ids_with_856_w)
-            log.debug(f"filtered ids: {len(ids)}")
+    def update_instance_ids(self, added_ids, removed_ids, snapshot_time):
+        """ Merge changed instances into the saved instance IDs, for reuse by later runs.  They are then up to date as of snapshot_time. """
+        count = write_merge(INSTANCE_IDS_FILENAME, self._instance_ids.packed(),
+            sorted_uuid_bytes(added_ids), sorted_uuid_bytes(removed_ids))
+        os.utime(INSTANCE_IDS_FILENAME, (snapshot_time, snapshot_time))
+        self._instance_ids.close()
+        self._instance_ids = InstanceIds(INSTANCE_IDS_FILENAME)
+        log.info(f"Updated instance IDs with {len(added_ids)} added and {len(removed_ids)} removed, now {count} IDs.")
 
-            with open(INSTANCE_IDS_FILENAME, 'w') as file:
-                json.dump(list(ids), file)
+    def snapshot_time(self):
+        # set to when the IDs were queried, or to the start of the delta run that last updated them
+        return os.path.getmtime(INSTANCE_IDS_FILENAME)
 
-        self._instance_ids = list(ids)
-        log.info(f"Loaded {len(self._instance_ids)} IDs.")
+    def discard_instance_ids(self):
+        """ Remove the saved instance IDs, so that the next run generates them again. """
+        self._instance_ids.close()
+        self._delete_instance_ids()
 
     def load_electronic_records(self, offset):
         log.debug("Getting electronic records via instance IDs")
         end_offset = offset + self.folio._batch_limit
-        query_offset = offset
+        instance_ids_queries = [self._instance_ids[query_offset : min(query_offset + self.folio._query_limit, end_offset)]
+            for query_offset in range(offset, end_offset, self.folio._query_limit)]
+        instance_ids_queries = [query for query in instance_ids_queries if query]
         batch_records = []
-        while query_offset < end_offset:
-            log.debug(f"... querying from offset {query_offset}")
-            query_end_offset = query_offset + self.folio._query_limit
-            instance_ids_query = self._instance_ids[query_offset : query_end_offset]
-            instance_records = self._get_instance_records(instance_ids_query)
+        for instance_records in self.folio.map_concurrent(self._get_instance_records, instance_ids_queries):
             records = [record for record in
                 [self._parse_record(instance_record) for instance_record in instance_records]
                 if record is not None]
             batch_records.extend(records)
-            query_offset = query_end_offset
         return batch_records
-        
+
     def _get_ids_with_field(self, field, subfield):
-        response = self._api_query_ids_with_field(field, subfield)
-        return response['records']
+        # the response is {"records": [<instance IDs>], "totalCount": n}; the only UUIDs in it are the IDs
+        response_chunks = self._api_query_ids_with_field(field, subfield)
+        return parse_uuids(response_chunks)
 
     def _api_query_ids_with_field(self, field, subfield):
         path = "/source-storage/stream/marc-record-identifiers"
         data = {"fieldsSearchExpression" : f"{field}.{subfield} is 'present'"}
-        return self.folio.client.folio_post(path, data=data)
+        return self.folio.client.folio_post_stream(path, data=data)
 
     def get_total_records(self):
         return len(self._instance_ids)
 
     def _get_instance_records(self, instance_ids):
-        result = self._api_query_instance_records(instance_ids)
+        if self._instance_lookup == 'retrieve':
+            result = self._api_retrieve_instance_records(instance_ids)
+        else:
+            result = self._api_query_instance_records(instance_ids)
         instance_records = result['instances']
         return instance_records
 
@@ -90,11 +107,24 @@ class SrsInstanceIdsStrategy(Strategy):
         params = f'?state=ACTUAL&query=({query_param})'
         return self.folio.client.folio_get(path, query = params)
 
+    def _api_retrieve_instance_records(self, instance_ids):
+        # the query is sent in the request body, so its length is not limited like a GET query string
+        path = "/instance-storage/instances/retrieve"
+        instance_ids = [f"\"{id}\"" for id in instance_ids]
+        data = {
+            "query": "id==(" + " or ".join(instance_ids) + ")",
+            "limit": len(instance_ids),
+        }
+        return self.folio.client.folio_post(path, data=data)
+
     def _parse_record(self, instance_record):
         if instance_record['discoverySuppress']:
             return None        
 
-        record = ElectronicRecord()
-        record.instance_hrid = instance_record['hrid']
-        record.url = instance_record['electronicAccess'][0]['uri']
+        record = ElectronicRecord(instance_record['hrid'])
+        for index, electronic_access in enumerate(instance_record['electronicAccess']):
+            if electronic_access.get('uri') and self.folio.url_filter.allows(electronic_access['uri']):
+                record.add_link(electronic_access['uri'], 'electronicAccess', index)
+        if not record.links:
+            return None
         return record
@@ -0,0 +1,63 @@
+import logging
+
+from folio_bad_urls.folio.srs_strategy import SrsStrategy
+from folio_bad_urls.folio.instance_ids import parse_uuids
+from folio_bad_urls.folio.json_stream import iter_array_items
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+# log.setLevel(logging.DEBUG)
+
+ELECTRONIC_RECORDS_EXPRESSION = "856.u is 'present' and 856.w is 'absent'"
+
+class SrsQueryStrategy(SrsStrategy):
+    """ Discover records with electronic resource links via an SRS MARC query, then load only those records. """
+
+    def __init__(self, folio):
+        super().__init__(folio)
+        log.addHandler(folio._config.log_file_handler)
+
+    def load_electronic_records(self, offset):
+        log.debug("Getting electronic records via SRS MARC query")
+        instance_ids = list(self._get_instance_ids(offset, self.folio._batch_limit))
+        instance_ids_queries = [instance_ids[index : index + self.folio._query_limit]
+            for index in range(0, len(instance_ids), self.folio._query_limit)]
+        records = []
+        for query_records in self.folio.map_concurrent(self._get_electronic_records, instance_ids_queries):
+            records.extend(query_records)
+        return records
+
+    def get_total_records(self):
+        result = self._api_query_instance_ids(0, 1)
+        return int(result['totalCount'])
+
+    def _get_instance_ids(self, offset, limit):
+        # the response is {"records": [<instance IDs>], "totalCount": n}; the only UUIDs in it are the IDs
+        return parse_uuids(self._api_stream_instance_ids(offset, limit))
+
+    def _instance_ids_query(self, offset, limit):
+        return {
+            "fieldsSearchExpression": ELECTRONIC_RECORDS_EXPRESSION,
+            "suppressFromDiscovery": False,
+            "deleted": False,
+            "offset": offset,
+            "limit": limit,
+        }
+
+    def _api_query_instance_ids(self, offset, limit):
+        path = "/source-storage/stream/marc-record-identifiers"
+        return self.folio.client.folio_post(path, data=self._instance_ids_query(offset, limit))
+
+    def _api_stream_instance_ids(self, offset, limit):
+        path = "/source-storage/stream/marc-record-identifiers"
+        return self.folio.client.folio_post_stream(path, data=self._instance_ids_query(offset, limit))
+
+    def _get_electronic_records(self, instance_ids):
+        # the response is {"sourceRecords": [...], "totalRecords": n}; parse each record as it arrives
+        srs_records = iter_array_items(self._api_stream_srs_records(instance_ids), 'sourceRecords')
+        return [record for record in map(self._parse_record, srs_records) if record is not None]
+
+    def _api_stream_srs_records(self, instance_ids):
+        # source records hold only the parsed MARC, not the raw record returned by /source-storage/records
+        path = "/source-storage/source-records?idType=INSTANCE&deleted=false"
+        return self.folio.client.folio_post_stream(path, data=instance_ids)
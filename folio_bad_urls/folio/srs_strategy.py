@@ -16,10 +16,13 @@ class SrsStrategy(Strategy):
 
     def load_electronic_records(self, offset):
         log.debug("Getting electronic records via SRS records")
-        srs_records = self._get_srs_records(offset)
-        records = [record for record in
-            [self._parse_record(srs_record) for srs_record in srs_records]
-            if record is not None]
+        end_offset = offset + self.folio._batch_limit
+        query_offsets = range(offset, end_offset, self.folio._query_limit)
+        records = []
+        for srs_records in self.folio.map_concurrent(self._get_srs_records, query_offsets):
+            records.extend([record for record in
+                [self._parse_record(srs_record) for srs_record in srs_records]
+                if record is not None])
         return records
         
     def get_total_records(self):
@@ -45,25 +48,24 @@ class SrsStrategy(Strategy):
         elif srs_record['additionalInfo']['suppressDiscovery']:
             return None
 
-        record = ElectronicRecord()
-        record.instance_hrid = srs_record['externalIdsHolder']['instanceHrid']
+        record = ElectronicRecord(srs_record['externalIdsHolder']['instanceHrid'])
 
         fields = srs_record['parsedRecord']['content']['fields']
-        found_856 = False
+        index_856 = 0
         for field in fields:
             if '856' in field:
                 field_856 = field['856']
-                found_856 = True
                 # log.debug(f"found 856: {field_856}")
                 subfields = field_856['subfields']
                 for subfield in subfields:
-                    if 'u' in subfield:
-                        record.url = subfield['u']
-                        # log.debug(f'... found URL: {record.url}')
+                    if 'u' in subfield and self.folio.url_filter.allows(subfield['u']):
+                        record.add_link(subfield['u'], '856', index_856)
+                        # log.debug(f"... found URL: {subfield['u']}")
                     if 'w' in subfield:
                         return None
+                index_856 += 1
 
-        if not found_856:
+        if not record.links:
             return None
         else:
             return record
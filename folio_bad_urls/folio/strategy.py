@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
 
+from folio_bad_urls.metrics import metrics
+
 class Strategy(ABC):
     """ A method of seraching folio for records linking to electronic resources. """
 
@@ -13,3 +15,18 @@ class Strategy(ABC):
     @abstractmethod
     def load_electronic_records(self, offset):
         pass
+
+    def snapshot_time(self):
+        """ When a saved list of the records to check was made, in seconds, or None if they are queried during the run. """
+        return None
+
+    def iter_electronic_records(self, start_offset, end_offset):
+        """ Yield (offset, records) for each batch from start_offset (inclusive) to end_offset (exclusive, or None for all). """
+        offset = start_offset
+        total_records = self.get_total_records()
+        while offset < total_records and (not end_offset or offset < end_offset):
+            with metrics.timer('folio_load_seconds'):
+                records = self.load_electronic_records(offset)
+            metrics.increment('folio_records_loaded_total', len(records))
+            yield offset, records
+            offset += self.folio._batch_limit
@@ -0,0 +1,54 @@
+import logging
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+# log.setLevel(logging.DEBUG)
+
+# responses faster than this, in seconds, let a healthy host's crawl delay shrink
+FAST_RESPONSE_SECONDS = 1.0
+DELAY_DECREASE_FACTOR = 0.9
+DELAY_INCREASE_FACTOR = 2.0
+
+class HostState:
+    """ Adaptive crawl delay and circuit breaker for one host. """
+
+    def __init__(self, base_url, delay, min_delay, max_delay, failure_threshold):
+        self.base_url = base_url
+        self.delay = delay
+        self._min_delay = min_delay
+        self._max_delay = max_delay
+        self._failure_threshold = failure_threshold
+        self.consecutive_failures = 0
+        self.circuit_open = False
+
+    def record_response(self, elapsed):
+        """ The host responded to a request after elapsed seconds. """
+        self.consecutive_failures = 0
+        if elapsed < FAST_RESPONSE_SECONDS:
+            self.delay = max(self._min_delay, self.delay * DELAY_DECREASE_FACTOR)
+
+    def record_throttled(self, retry_after):
+        """ The host asked for requests to slow down, possibly giving a number of seconds to wait. """
+        self.consecutive_failures = 0
+        self.delay = min(self._max_delay, max(self.delay * DELAY_INCREASE_FACTOR, retry_after or 0))
+        log.info(f"Host {self.base_url} is throttling requests, crawl delay is now {self.delay:.1f} seconds.")
+
+    def record_connection_failure(self):
+        self.consecutive_failures += 1
+        if not self.circuit_open and self.consecutive_failures >= self._failure_threshold:
+            self.circuit_open = True
+            log.warning(f"Host {self.base_url} failed {self.consecutive_failures} times in a row, skipping its remaining URLs.")
+
+    def reset_circuit(self):
+        """ Allow requests to the host again, such as for a final retry of its skipped URLs. """
+        self.circuit_open = False
+        self.consecutive_failures = self._failure_threshold - 1
+
+def parse_retry_after(value):
+    """ Seconds to wait from a Retry-After header, or None if it is absent or an HTTP date. """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
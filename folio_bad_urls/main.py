@@ -6,7 +6,12 @@ from os.path import exists
 from folio_bad_urls.folio.main import Folio
 from folio_bad_urls.data import ElectronicRecord
 from folio_bad_urls.web import WebTester
+from folio_bad_urls.scheduler import HostScheduler
 from folio_bad_urls.reporter import Reporter
+from folio_bad_urls.cache import ResultCache, RobotsCache
+from folio_bad_urls.checkpoint import Checkpoint
+from folio_bad_urls.sharding import Shard
+from folio_bad_urls.metrics import metrics, MetricsReporter
 
 logging.basicConfig()
 log = logging.getLogger(__name__)
@@ -16,7 +21,7 @@ log.setLevel(logging.INFO)
 class FolioBadUrls:
     """ Report on Bad URLs for electronic resource links within FOLIO records. """
 
-    def __init__(self, config_file, reuse_instance_ids):
+    def __init__(self, config_file, reuse_instance_ids, shard=None, resume=False):
         if not exists(config_file):
             raise FileNotFoundError(f"Cannot find config file: {config_file}")
 
@@ -26,9 +31,24 @@ class FolioBadUrls:
         log.info(f"Initialized with config file {config_file}")
         # Note: Config contains the FOLIO credentials.  Consider logging destinations.
         # print("Config: ", {section: dict(self.config[section]) for section in self.config.sections()})
-        self.folio = Folio(self._config, reuse_instance_ids)
-        self.web = WebTester(self._config)
-        self.reporter = Reporter(self._config)
+        # shards share the instance IDs and delta state, and would each rewrite them with their own view of the run
+        if shard and self._config.getboolean('Folio', 'delta_mode', fallback=False):
+            raise Exception("Sharded runs cannot be used with delta_mode.")
+        self.checkpoint = Checkpoint(self._config, shard)
+        # a resumed run needs its checkpoint before loading records, to continue in the same delta mode
+        if resume:
+            self.checkpoint.load()
+        self.folio = Folio(self._config, reuse_instance_ids, self.checkpoint if resume else None)
+        use_cache = self._config.has_option('Cache', 'cache_file')
+        self.robots_cache = RobotsCache(self._config) if use_cache else None
+        self.web = WebTester(self._config, self.robots_cache)
+        self.cache = ResultCache(self._config) if use_cache else None
+        self.shard = shard
+        if self.shard:
+            log.info(f"Testing only URLs of hosts in shard {shard.index} of {shard.count}.")
+        self.scheduler = HostScheduler(self._config, self.web, self.cache, self.checkpoint)
+        self.reporter = Reporter(self._config, shard)
+        self.metrics_reporter = MetricsReporter(self._config, shard)
 
     def _init_log(self):
         log_file = self._config.get("Logging", "log_file", fallback=None)
@@ -40,31 +60,59 @@ class FolioBadUrls:
             self._config.log_file_handler = logging.NullHandler()  # type: ignore
 
     def run(self, start_offset, end_offset):
-        BATCH_LIMIT = int(self._config.get('Folio', 'batch_limit'))
-        offset = start_offset
+        self.checkpoint.start(start_offset, end_offset, self.folio.run_started(),
+            self.folio.is_delta_run(), self.folio.updated_since())
+        self.reporter.open()
+        self._run_from(start_offset, end_offset)
+
+    def resume(self):
+        """ Continue the run in the checkpoint, which must have been loaded by creating this with resume. """
+        self.scheduler.add_tested_results(self.checkpoint.batch_results)
+        self.reporter.open(append=True)
+        self._run_from(self.checkpoint.next_offset(), self.checkpoint.end_offset)
+
+    def _run_from(self, offset, end_offset):
         total_records = self.folio.get_total_records()
         log.info(f"Total records to check: {total_records}")
-        total_bad_urls = 0
-        while offset < total_records and (not end_offset or offset < end_offset):
-            results = self.run_batch(offset)
-            bad_urls = self.reporter.write_results(offset, results)
-            total_bad_urls += bad_urls
-            offset += BATCH_LIMIT
-        log.info(f"Completed run with {total_bad_urls} total bad URLs.")
+        run_end_offset = min(end_offset, total_records) if end_offset else total_records
+        metrics.set_gauge('run_records_total', max(0, run_end_offset - offset))
+        try:
+            self.metrics_reporter.start()
+            for batch_offset, records in self.folio.iter_electronic_records(offset, end_offset):
+                results = self.run_batch(batch_offset, records)
+                bad_urls = self.reporter.write_results(batch_offset, results)
+                self.checkpoint.complete_batch(batch_offset, bad_urls)
+                batch_end_offset = min(batch_offset + self.folio._batch_limit, run_end_offset)
+                metrics.set_gauge('run_records_done', batch_end_offset - offset)
+                metrics.increment('bad_urls_total', bad_urls)
+        finally:
+            # keep results tested so far in the current batch if the run is interrupted
+            self.checkpoint.save()
+            self.reporter.close()
+            self.metrics_reporter.stop()
+        log.info(f"Completed run with {self.checkpoint.total_bad_urls} total bad URLs.")
+        self.checkpoint.delete()
+        self.web.close()
+        all_records = self.checkpoint.start_offset == 0 and not end_offset
+        # a resumed run started when its checkpoint did; batches before the interruption saw URLs since then
+        run_started = self.checkpoint.run_started
+        self.folio.complete_run(all_records, run_started or self.folio.run_started())
+        if self.cache:
+            # a delta run sees only some URLs, so the others must not be evicted, and a shard sees only its own hosts';
+            # nor can a run resumed from a checkpoint that did not record its start
+            if all_records and not self.folio.is_delta_run() and run_started:
+                self.cache.evict_unseen(run_started, self.shard.owns if self.shard else None)
+            self.cache.close()
+        if self.robots_cache:
+            self.robots_cache.evict_expired()
+            self.robots_cache.close()
 
-    def run_batch(self, offset):
-        # TODO use some limit intelligently to allow restart after a point
-        records = self.folio.load_electronic_records(offset)
+    def run_batch(self, offset, records):
         log.info(f"Batch {offset}: found {len(records)} electronic records matching criteria.")
-        results = []
-        for index, record in enumerate(records):
-            if index % 10 == 0:
-                log.debug(f"... at index {index} within query")
-            result = self.web.test_record(record)
-            if result:
-                log.debug(f"Result {result} for record: {record}")
-                results.append(result)
-        return results
+        if self.shard:
+            records = self.shard.filter_records(records)
+            log.info(f"Batch {offset}: {len(records)} records have links to hosts in this shard.")
+        return self.scheduler.test_records(records)
         
 def main():
     parser = argparse.ArgumentParser(description="Report on URLs in 856 fields.")
@@ -75,10 +123,24 @@ def main():
         help='Ending offset (exclusive) for the FOLIO query.  Default is no ending, retrieve all records.')
     parser.add_argument('-i,', '--reuse-instance-ids', dest='reuse_instance_ids', type=bool, default=False, 
         help='Continue to use a previously retrieved list of instance IDs.')
+    parser.add_argument('-r', '--resume', dest='resume', action='store_true',
+        help='Resume the previous run from its checkpoint.  Offsets from the previous run are used, and instance IDs are reused.')
+    parser.add_argument('--shard-index', dest='shard_index', type=int, default=None,
+        help='Test only URLs of hosts in this shard, from 0 to shard count - 1.  Requires --shard-count.')
+    parser.add_argument('--shard-count', dest='shard_count', type=int, default=None,
+        help='Number of shards that hosts are divided between.')
     args = parser.parse_args()
+    if (args.shard_index is None) != (args.shard_count is None):
+        parser.error("--shard-index and --shard-count must be used together")
+    shard = Shard(args.shard_index, args.shard_count) if args.shard_count else None
 
-    folio_bad_urls = FolioBadUrls(args.config_file, args.reuse_instance_ids)
-    folio_bad_urls.run(args.start_offset, args.end_offset)
+    # resuming must use the same list of instance IDs so that offsets refer to the same records
+    reuse_instance_ids = args.reuse_instance_ids or args.resume
+    folio_bad_urls = FolioBadUrls(args.config_file, reuse_instance_ids, shard, args.resume)
+    if args.resume:
+        folio_bad_urls.resume()
+    else:
+        folio_bad_urls.run(args.start_offset, args.end_offset)
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,70 @@
+import argparse
+import csv
+import gzip
+import logging
+
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+def _open_text(filename, mode):
+    if filename.endswith('.gz'):
+        return gzip.open(filename, mode + 't', newline='', encoding='utf-8')
+    return open(filename, mode, newline='', encoding='utf-8')
+
+def merge_csv(output_file, input_files):
+    """ Combine CSV reports, keeping the header of the first. """
+    rows = 0
+    with _open_text(output_file, 'w') as output:
+        writer = csv.writer(output)
+        for index, input_file in enumerate(input_files):
+            with _open_text(input_file, 'r') as file:
+                reader = csv.reader(file)
+                header = next(reader, None)
+                if index == 0 and header:
+                    writer.writerow(header)
+                for row in reader:
+                    writer.writerow(row)
+                    rows += 1
+    return rows
+
+def merge_json_lines(output_file, input_files):
+    rows = 0
+    with _open_text(output_file, 'w') as output:
+        for input_file in input_files:
+            with _open_text(input_file, 'r') as file:
+                for line in file:
+                    output.write(line)
+                    rows += 1
+    return rows
+
+def merge_parquet(output_file, input_files):
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise Exception("Merging Parquet requires the pyarrow package.")
+    table = pyarrow.concat_tables([pyarrow.parquet.read_table(input_file) for input_file in input_files])
+    pyarrow.parquet.write_table(table, output_file)
+    return table.num_rows
+
+def merge(output_file, input_files):
+    name = output_file[:-3] if output_file.endswith('.gz') else output_file
+    if name.endswith('.parquet'):
+        rows = merge_parquet(output_file, input_files)
+    elif name.endswith('.csv'):
+        rows = merge_csv(output_file, input_files)
+    else:
+        rows = merge_json_lines(output_file, input_files)
+    log.info(f"Merged {rows} results from {len(input_files)} files into {output_file}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the partial results of sharded runs.")
+    parser.add_argument('-o', '--output', dest='output_file', required=True,
+        help='Merged file.  Its extension (.csv, .jsonl or .parquet, optionally .gz) must match the inputs.')
+    parser.add_argument('input_files', nargs='+', help='Partial result files, e.g. result.shard-*.csv')
+    args = parser.parse_args()
+    merge(args.output_file, args.input_files)
+
+if __name__ == '__main__':
+    main()
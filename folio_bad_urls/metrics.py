@@ -0,0 +1,225 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+# log.setLevel(logging.DEBUG)
+
+# upper bounds in seconds of the histogram buckets
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+TOP_HOSTS = 5
+
+class Histogram:
+    """ Counts of observed values in fixed buckets, with their sum. """
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.bucket_counts[index] += 1
+                break
+
+class Metrics:
+    """ Counters, gauges and timing histograms collected across threads during a run.
+
+    Metric names may have labels, given as a dict, e.g. {'status_code': '404'}.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._counters = dict()
+        self._gauges = dict()
+        self._histograms = dict()
+        # seconds slept for each host's crawl delay, kept for the summary only, as a series per host would grow without limit
+        self._host_sleep_seconds = dict()
+
+    def increment(self, name, value=1, labels=None):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, labels=None):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def add_gauge(self, name, value, labels=None):
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram()
+            self._histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, labels=None):
+        """ Observe the seconds spent in a block in a histogram. """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    def record_crawl_delay_sleep(self, base_url, seconds):
+        """ Count time slept for a host's crawl delay, in total and, for the summary, by host. """
+        self.observe('crawl_delay_sleep_seconds', seconds)
+        self.increment('crawl_delay_sleep_seconds_total', seconds)
+        with self._lock:
+            self._host_sleep_seconds[base_url] = self._host_sleep_seconds.get(base_url, 0) + seconds
+
+    def counter(self, name, labels=None):
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def gauge(self, name, labels=None):
+        with self._lock:
+            return self._gauges.get(self._key(name, labels), 0)
+
+    def _key(self, name, labels):
+        return (name, tuple(sorted(labels.items())) if labels else ())
+
+    def summary(self):
+        """ A one-line description of the run's progress, throughput and where its time went. """
+        elapsed = time.time() - self._started
+        done = self.gauge('run_records_done')
+        total = self.gauge('run_records_total')
+        rate = done / elapsed if elapsed else 0
+        eta = f"{(total - done) / rate / 3600:.1f} h" if rate and total > done else "unknown"
+        urls_tested = self.counter('urls_tested_total')
+        with self._lock:
+            timings = {name: histogram.sum for (name, labels), histogram in self._histograms.items() if not labels}
+            statuses = {dict(labels)['status_code']: value for (name, labels), value in self._counters.items()
+                if name == 'http_responses_total'}
+            sleeps = sorted(((seconds, host) for host, seconds in self._host_sleep_seconds.items()), reverse=True)[:TOP_HOSTS]
+        return (f"{done}/{total} records ({rate:.1f}/s, ETA {eta}), {urls_tested} URLs tested "
+            f"({urls_tested / elapsed if elapsed else 0:.1f}/s). "
+            f"Seconds by phase: {', '.join(f'{name} {seconds:.0f}' for name, seconds in sorted(timings.items()))}. "
+            f"Statuses: {dict(sorted(statuses.items()))}. "
+            f"Most crawl delay: {', '.join(f'{host} {seconds:.0f}s' for seconds, host in sleeps) or 'none'}.")
+
+    def to_json(self):
+        with self._lock:
+            return json.dumps({
+                'elapsed_seconds': time.time() - self._started,
+                'counters': [self._json_item(key, value) for key, value in self._counters.items()],
+                'gauges': [self._json_item(key, value) for key, value in self._gauges.items()],
+                'histograms': [self._json_item(key, {'count': histogram.count, 'sum': histogram.sum,
+                    'buckets': dict(zip([str(bound) for bound in BUCKETS], histogram.bucket_counts))})
+                    for key, histogram in self._histograms.items()],
+            })
+
+    def _json_item(self, key, value):
+        name, labels = key
+        return {'name': name, 'labels': dict(labels), 'value': value}
+
+    def to_prometheus(self):
+        """ The metrics in the Prometheus text exposition format. """
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                lines.append(f"folio_bad_urls_{name}{self._prometheus_labels(labels)} {value}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                lines.append(f"folio_bad_urls_{name}{self._prometheus_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.bucket_counts):
+                    cumulative += count
+                    bound_label = '+Inf' if bound == float('inf') else str(bound)
+                    lines.append(f"folio_bad_urls_{name}_bucket{self._prometheus_labels(labels + (('le', bound_label),))} {cumulative}")
+                lines.append(f"folio_bad_urls_{name}_sum{self._prometheus_labels(labels)} {histogram.sum}")
+                lines.append(f"folio_bad_urls_{name}_count{self._prometheus_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def _prometheus_labels(self, labels):
+        if not labels:
+            return ''
+        escaped = [(key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in labels]
+        return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+# shared by all modules, like their loggers
+metrics = Metrics()
+
+class MetricsReporter:
+    """ Periodically log a summary of the metrics, and optionally write them to a file or serve them over HTTP. """
+
+    def __init__(self, config, shard=None):
+        self._config = config
+        log.addHandler(self._config.log_file_handler)
+
+        self._SUMMARY_INTERVAL = float(self._config.get('Metrics', 'summary_interval', fallback=60))
+        self._METRICS_FILE = self._config.get('Metrics', 'metrics_file', fallback=None)
+        self._METRICS_PORT = self._config.get('Metrics', 'metrics_port', fallback=None)
+        # shards on one machine each write their own file and serve on their own port, metrics_port + shard index
+        if shard:
+            if self._METRICS_FILE:
+                self._METRICS_FILE = shard.filename(self._METRICS_FILE)
+            if self._METRICS_PORT:
+                self._METRICS_PORT = int(self._METRICS_PORT) + shard.index
+
+        self._stopped = threading.Event()
+        self._thread = None
+        self._server = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._report_periodically, name="metrics", daemon=True)
+        self._thread.start()
+        if self._METRICS_PORT:
+            self._server = ThreadingHTTPServer(('', int(self._METRICS_PORT)), _MetricsHandler)
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+            log.info(f"Serving metrics on port {self._METRICS_PORT}")
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        self.report()
+
+    def _report_periodically(self):
+        while not self._stopped.wait(self._SUMMARY_INTERVAL):
+            self.report()
+
+    def report(self):
+        log.info(metrics.summary())
+        if self._METRICS_FILE:
+            text = metrics.to_json() if self._METRICS_FILE.endswith('.json') else metrics.to_prometheus()
+            temp_filename = self._METRICS_FILE + '.tmp'
+            with open(temp_filename, 'w') as file:
+                file.write(text)
+            os.replace(temp_filename, self._METRICS_FILE)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """ Serve the metrics as Prometheus text, or as JSON at /metrics.json. """
+
+    def do_GET(self):
+        if self.path.startswith('/metrics.json'):
+            body, content_type = metrics.to_json(), 'application/json'
+        else:
+            body, content_type = metrics.to_prometheus(), 'text/plain; version=0.0.4'
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('content-type', content_type)
+        self.send_header('content-length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,52 @@
+import logging
+import queue
+import threading
+
+from folio_bad_urls.metrics import metrics
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+# log.setLevel(logging.DEBUG)
+
+_DONE = object()
+
+def prefetch(iterable, size):
+    """ Iterate over the iterable in a background thread, keeping up to size items ready in a bounded queue.
+
+    Exceptions raised by the iterable are re-raised to the consumer.
+    """
+    items = queue.Queue(maxsize=size)
+    stopped = threading.Event()
+
+    def put(item):
+        # retry so that the producer can notice when the consumer has stopped
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(e)
+
+    producer = threading.Thread(target=produce, name="prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = items.get()
+            metrics.set_gauge('prefetch_queue_depth', items.qsize())
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stopped.set()
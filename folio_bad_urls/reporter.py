@@ -1,34 +1,157 @@
+import csv
+import gzip
+import json
 import logging
+import os
+
+from folio_bad_urls.metrics import metrics
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
 
-HEADER = "instance_hrid, url, status_code, insecure_url, permanent_redirect\n"
+HEADER = ["instance_hrid", "url", "status_code", "insecure_url", "permanent_redirect", "link_field", "link_index"]
+WRITE_BUFFER_SIZE = 1024 * 1024
 
 class Reporter:
-    """ Save bad URLs to a file. """
+    """ Save bad URLs to a CSV file, and optionally all results to a JSON Lines or Parquet file. """
 
-    def __init__(self, config):
+    def __init__(self, config, shard=None):
         self._config = config
         log.addHandler(self._config.log_file_handler)
 
+        self._OUTPUT_FILE = self._config.get('Reporter', 'output_file', fallback='result.csv')
+        self._COMPRESS = self._config.getboolean('Reporter', 'compress', fallback=False)
+        self._ALL_RESULTS_FILE = self._config.get('Reporter', 'all_results_file', fallback=None)
+        # each shard writes partial results to its own files, to be combined by folio_bad_urls.merge
+        if shard:
+            self._OUTPUT_FILE = shard.filename(self._OUTPUT_FILE)
+            if self._ALL_RESULTS_FILE:
+                self._ALL_RESULTS_FILE = shard.filename(self._ALL_RESULTS_FILE)
+
+        self._file = self._writer = None
+        self._all_results = None
+
+    def open(self, append=False):
+        """ Open the output files.  If append, add to the files of an earlier, interrupted run. """
+        filename = self._OUTPUT_FILE + ('.gz' if self._COMPRESS else '')
+        write_header = not (append and os.path.exists(filename))
+        self._file = self._open_text(filename, 'a' if append else 'w')
+        self._writer = csv.writer(self._file)
+        if write_header:
+            self._writer.writerow(HEADER)
+        log.info(f"Writing bad URLs to {filename}")
+
+        if self._ALL_RESULTS_FILE:
+            if self._ALL_RESULTS_FILE.endswith('.parquet'):
+                self._all_results = ParquetResultWriter(self._ALL_RESULTS_FILE, append)
+            else:
+                self._all_results = JsonLinesResultWriter(self._open_text(self._ALL_RESULTS_FILE, 'a' if append else 'w'))
+            log.info(f"Writing all results to {self._ALL_RESULTS_FILE}")
+
+    def _open_text(self, filename, mode):
+        if filename.endswith('.gz'):
+            return gzip.open(filename, mode + 't', newline='', encoding='utf-8')
+        return open(filename, mode, newline='', encoding='utf-8', buffering=WRITE_BUFFER_SIZE)
+
     def write_results(self, offset, results):
-        filename = f'result_{str(offset)}.csv'
+        with metrics.timer('report_write_seconds'):
+            bad_urls = self._write_results(offset, results)
+        log.info(f"Wrote {bad_urls} bad URLs for batch {offset}.")
+        return bad_urls
+
+    def _write_results(self, offset, results):
         bad_urls = 0
-        with open(filename, 'w') as file:
-            file.write(HEADER)
-            for result in results:
-                if result.is_bad_url():
-                    bad_urls += 1
-                    result_line = self._format_result(result)
-                    file.write(result_line)
-        log.info(f"Wrote file with {bad_urls} bad URLs.")
+        for result in results:
+            if result.is_bad_url():
+                bad_urls += 1
+                self._writer.writerow(self._format_result(result))
+        # flush each batch, so the output is complete up to the last batch recorded in the checkpoint
+        self._file.flush()
+        if self._all_results:
+            self._all_results.write(offset, results)
         return bad_urls
 
+    def close(self):
+        if self._file:
+            self._file.close()
+        if self._all_results:
+            self._all_results.close()
+
     def _format_result(self, result):
-        return f"{result.instance_hrid}, \
-            {result.url}, \
-            {result.status_code}, \
-            {result.is_insecure_url() if result.is_insecure_url() else ''}, \
-            {result.permanent_redirect if result.permanent_redirect else ''} \
-            \n"
+        return [
+            result.instance_hrid,
+            result.url,
+            result.status_code,
+            result.is_insecure_url() if result.is_insecure_url() else '',
+            result.permanent_redirect if result.permanent_redirect else '',
+            result.link.field if result.link else '',
+            result.link.index if result.link else '',
+        ]
+
+def result_fields(offset, result):
+    """ All fields of a result, including good ones, for analysis outside of the CSV report. """
+    return {
+        "batch_offset": offset,
+        "instance_hrid": result.instance_hrid,
+        "url": result.url,
+        "status_code": result.status_code,
+        "bad_url": result.is_bad_url(),
+        "insecure_url": result.is_insecure_url(),
+        "permanent_redirect": result.permanent_redirect,
+        "link_field": result.link.field if result.link else None,
+        "link_index": result.link.index if result.link else None,
+    }
+
+class JsonLinesResultWriter:
+    """ Write all results as JSON Lines, one object per result. """
+
+    def __init__(self, file):
+        self._file = file
+
+    def write(self, offset, results):
+        for result in results:
+            self._file.write(json.dumps(result_fields(offset, result)))
+            self._file.write('\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+class ParquetResultWriter:
+    """ Write all results to a Parquet file, one row group per batch.  Requires pyarrow. """
+
+    def __init__(self, filename, append):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise Exception("Writing Parquet requires the pyarrow package.")
+        self._pyarrow = pyarrow
+        # a Parquet file cannot be appended to, so a resumed run writes its results to a separate file
+        if append and os.path.exists(filename):
+            base, extension = os.path.splitext(filename)
+            part = 1
+            while os.path.exists(f"{base}_{part}{extension}"):
+                part += 1
+            filename = f"{base}_{part}{extension}"
+        self._schema = pyarrow.schema([
+            ("batch_offset", pyarrow.int64()),
+            ("instance_hrid", pyarrow.string()),
+            ("url", pyarrow.string()),
+            ("status_code", pyarrow.int32()),
+            ("bad_url", pyarrow.bool_()),
+            ("insecure_url", pyarrow.bool_()),
+            ("permanent_redirect", pyarrow.string()),
+            ("link_field", pyarrow.string()),
+            ("link_index", pyarrow.int32()),
+        ])
+        self._writer = pyarrow.parquet.ParquetWriter(filename, self._schema)
+
+    def write(self, offset, results):
+        if not results:
+            return
+        rows = [result_fields(offset, result) for result in results]
+        self._writer.write_table(self._pyarrow.Table.from_pylist(rows, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
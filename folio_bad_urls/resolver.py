@@ -0,0 +1,89 @@
+import logging
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from folio_bad_urls.metrics import metrics
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+# log.setLevel(logging.DEBUG)
+
+# getaddrinfo errors meaning the name does not exist, rather than that the lookup failed for now
+NAME_NOT_FOUND_ERRORS = {socket.EAI_NONAME} | ({socket.EAI_NODATA} if hasattr(socket, 'EAI_NODATA') else set())
+
+class HostResolver:
+    """ Resolve hosts ahead of testing them, and remember for the run which hosts are dead. """
+
+    def __init__(self, config):
+        self._config = config
+        log.addHandler(self._config.log_file_handler)
+
+        self._SKIP_DEAD_HOSTS = self._config.getboolean('WebTester', 'skip_dead_hosts', fallback=True)
+        self._MAX_WORKERS = int(self._config.get('WebTester', 'resolver_workers', fallback=20))
+
+        self._resolved = set()
+        # reasons the host could not be reached, keyed by base URL
+        self._dead_hosts = dict()
+
+    def is_dead(self, base_url):
+        return base_url in self._dead_hosts
+
+    def mark_dead(self, base_url, reason):
+        """ Skip the remaining URLs of a host for the rest of the run.  Thread-safe. """
+        if not self._SKIP_DEAD_HOSTS:
+            return
+        if base_url not in self._dead_hosts:
+            log.info(f"Host {base_url} is unreachable, skipping its URLs: {reason}")
+            metrics.increment('dead_hosts_total', labels={'reason': reason})
+        self._dead_hosts[base_url] = reason
+
+    def resolve_all(self, base_urls):
+        """ Look up the hosts not yet resolved concurrently, marking those whose names do not exist as dead. """
+        if not self._SKIP_DEAD_HOSTS:
+            return
+        base_urls = set(base_urls) - self._resolved - self._dead_hosts.keys()
+        if not base_urls:
+            return
+        log.debug(f"Resolving {len(base_urls)} hosts.")
+        with metrics.timer('dns_resolve_seconds'), ThreadPoolExecutor(max_workers=self._MAX_WORKERS) as executor:
+            for base_url, reason in zip(base_urls, executor.map(self._resolve, base_urls)):
+                if reason:
+                    self.mark_dead(base_url, reason)
+                else:
+                    self._resolved.add(base_url)
+
+    def _resolve(self, base_url):
+        parsed_url = urlparse(base_url)
+        if not parsed_url.hostname:
+            return None
+        try:
+            socket.getaddrinfo(parsed_url.hostname, parsed_url.port or parsed_url.scheme, type=socket.SOCK_STREAM)
+            return None
+        except socket.gaierror as e:
+            # other lookup failures may be temporary, so leave those hosts to be tried
+            if e.errno in NAME_NOT_FOUND_ERRORS:
+                return 'name not found'
+            log.debug(f"Could not resolve {base_url}, will try it anyway: {e}")
+            return None
+        except (UnicodeError, ValueError, OSError) as e:
+            log.debug(f"Could not resolve {base_url}, will try it anyway: {e}")
+            return None
+
+def dead_host_reason(exception):
+    """ Why a connection error shows its host to be dead, or None if it may have been a passing failure. """
+    seen = set()
+    causes = [exception]
+    while causes:
+        cause = causes.pop()
+        if cause is None or id(cause) in seen:
+            continue
+        seen.add(id(cause))
+        if isinstance(cause, ConnectionRefusedError):
+            return 'connection refused'
+        if isinstance(cause, socket.gaierror) and cause.errno in NAME_NOT_FOUND_ERRORS:
+            return 'name not found'
+        # requests and urllib3 wrap the socket error in their own exceptions, as arguments, a reason or a cause
+        causes.extend([cause.__cause__, cause.__context__, getattr(cause, 'reason', None)])
+        causes.extend(arg for arg in cause.args if isinstance(arg, BaseException))
+    return None
@@ -0,0 +1,179 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from folio_bad_urls.data import LocalStatusCode
+from folio_bad_urls.metrics import metrics
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+# log.setLevel(logging.DEBUG)
+
+class HostScheduler:
+    """ Test records concurrently, keeping one queue of URLs per host and testing each distinct URL once per run. """
+
+    def __init__(self, config, web, cache=None, checkpoint=None):
+        self._config = config
+        log.addHandler(self._config.log_file_handler)
+        self._web = web
+        self._cache = cache
+        self._checkpoint = checkpoint
+
+        self._MAX_WORKERS = int(self._config.get('WebTester', 'max_workers', fallback=10))
+
+        # results of URLs already tested during this run, keyed by URL; None if the URL was skipped
+        self._tested_urls = dict()
+
+    def add_tested_results(self, results_by_url):
+        """ Reuse results of URLs tested previously, such as by an interrupted run. """
+        self._tested_urls.update(results_by_url)
+
+    def test_records(self, records):
+        """ Test every link of the records and return their results in the order the records and links were given. """
+        urls = self._distinct_urls(records)
+        untested = [url for url in urls if url not in self._tested_urls]
+        if self._cache:
+            self._cache.mark_seen(urls)
+            untested = self._use_cached_results(untested)
+        log.debug(f"Batch has {len(records)} records with {len(urls)} distinct URLs, {len(untested)} untested.")
+
+        tested = self._test_urls(untested)
+        self._tested_urls.update(tested)
+        if self._cache:
+            self._cache.put_all([result for result in tested.values() if result])
+
+        results = []
+        for record in records:
+            for link in record.links:
+                result = self._tested_urls[link.url]
+                if result:
+                    results.append(result.for_record(record.instance_hrid, link))
+        return results
+
+    def _use_cached_results(self, urls):
+        untested = []
+        for url in urls:
+            result = self._cache.get(url)
+            if result:
+                metrics.increment('cache_hits_total')
+                self._tested_urls[url] = result
+            else:
+                untested.append(url)
+        return untested
+
+    def _distinct_urls(self, records):
+        # a dict keeps the URLs in the order they were first found
+        urls = dict()
+        for record in records:
+            for link in record.links:
+                urls[link.url] = None
+        return list(urls)
+
+    def _test_urls(self, urls):
+        results_by_url = self._test_urls_by_host(urls)
+
+        # retry URLs skipped by an open circuit once more, in case their host has recovered
+        deferred = [url for url, result in results_by_url.items()
+            if result and result.status_code == LocalStatusCode.HOST_CIRCUIT_OPEN]
+        if deferred:
+            log.info(f"Retrying {len(deferred)} URLs skipped due to failing hosts.")
+            for url in deferred:
+                self._web.reset_circuit(url)
+            results_by_url.update(self._test_urls_by_host(deferred))
+        return results_by_url
+
+    def _test_urls_by_host(self, urls):
+        self._web.prefetch_crawl_rules(urls)
+        host_queues = HostQueues(self._web, self._group_by_host(urls))
+        log.debug(f"Testing {len(urls)} URLs across {len(host_queues)} hosts.")
+
+        metrics.add_gauge('urls_pending', len(urls))
+        metrics.set_gauge('host_queues', len(host_queues))
+        workers = min(self._MAX_WORKERS, len(host_queues))
+        results_by_url = dict()
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            futures = [executor.submit(self._test_from_queues, host_queues) for _ in range(workers)]
+            for future in futures:
+                results_by_url.update(future.result())
+        return results_by_url
+
+    def _group_by_host(self, urls):
+        host_queues = dict()
+        for url in urls:
+            base_url = self._web._parse_base_url(url)
+            host_queues.setdefault(base_url, []).append(url)
+        return host_queues
+
+    def _test_from_queues(self, host_queues):
+        # Each worker tests one URL at a time from whichever host can be queried soonest.
+        results = dict()
+        while True:
+            url = host_queues.next_url()
+            if url is None:
+                return results
+            try:
+                result = self._web.test_url(url)
+            finally:
+                host_queues.done(url)
+            log.debug(f"Result {result} for url: {url}")
+            metrics.add_gauge('urls_pending', -1)
+            metrics.increment('urls_tested_total')
+            metrics.increment('http_responses_total', labels={'status_code': str(result.status_code)})
+            results[url] = result
+            if self._checkpoint:
+                self._checkpoint.record_result(url, result)
+
+class HostQueues:
+    """ Queues of URLs by host, handing out the next URL of the host whose crawl delay ends soonest.
+
+    A host is handed to only one worker at a time, so the WebTester's per-host crawl delay still applies,
+    but workers move on to other hosts rather than waiting out a delay.  Thread-safe.
+    """
+
+    def __init__(self, web, urls_by_host):
+        self._web = web
+        self._queues = {base_url: deque(urls) for base_url, urls in urls_by_host.items()}
+        self._condition = threading.Condition()
+        # hosts not being tested, as (next query time, order, base URL); the order breaks ties first come, first served
+        self._order = itertools.count()
+        self._ready = [(web.next_query_time(urls[0]), next(self._order), base_url)
+            for base_url, urls in urls_by_host.items()]
+        heapq.heapify(self._ready)
+        self._active = 0
+
+    def __len__(self):
+        return len(self._queues)
+
+    def next_url(self):
+        """ Take the next URL to test, waiting until its host can be queried, or None once all are taken. """
+        with self._condition:
+            while True:
+                if not self._ready:
+                    if not self._active:
+                        return None
+                    # another worker will return its host, or finish
+                    self._condition.wait()
+                    continue
+                next_query_time, _, base_url = self._ready[0]
+                wait_time = next_query_time - time.time()
+                if wait_time > 0:
+                    # wake early if another host is returned and may be ready sooner
+                    self._condition.wait(wait_time)
+                    continue
+                heapq.heappop(self._ready)
+                self._active += 1
+                return self._queues[base_url].popleft()
+
+    def done(self, url):
+        """ Return the host of a tested URL, to be scheduled again if it has more URLs. """
+        base_url = self._web._parse_base_url(url)
+        with self._condition:
+            self._active -= 1
+            queue = self._queues[base_url]
+            if queue:
+                heapq.heappush(self._ready, (self._web.next_query_time(queue[0]), next(self._order), base_url))
+            self._condition.notify_all()
@@ -0,0 +1,54 @@
+import logging
+import threading
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+# log.setLevel(logging.DEBUG)
+
+# origins each host's session keeps connections to, so redirects (http to https, proxies, DOI and link
+# resolvers) do not evict the connection to the host itself
+POOLS_PER_SESSION = 4
+
+class SessionPool:
+    """ Keep-alive HTTP sessions, one per host, with the least recently used closed when the pool is full. """
+
+    def __init__(self, config, headers):
+        self._config = config
+        log.addHandler(self._config.log_file_handler)
+        self._headers = headers
+
+        self._MAX_SESSIONS = int(self._config.get('WebTester', 'max_sessions', fallback=100))
+
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, base_url):
+        with self._lock:
+            if base_url in self._sessions:
+                self._sessions.move_to_end(base_url)
+                return self._sessions[base_url]
+
+            session = self._new_session()
+            self._sessions[base_url] = session
+            if len(self._sessions) > self._MAX_SESSIONS:
+                _, oldest_session = self._sessions.popitem(last=False)
+                oldest_session.close()
+            return session
+
+    def _new_session(self):
+        session = requests.Session()
+        session.headers.update(self._headers)
+        adapter = HTTPAdapter(pool_connections=POOLS_PER_SESSION, pool_maxsize=1)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
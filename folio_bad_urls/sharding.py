@@ -0,0 +1,36 @@
+import os
+import zlib
+from urllib.parse import urlparse
+
+from folio_bad_urls.data import ElectronicRecord
+
+class Shard:
+    """ One of several disjoint sets of hosts, so that separate processes never send requests to the same host. """
+
+    def __init__(self, index, count):
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"Shard index must be from 0 to shard count - 1, got {index} of {count}.")
+        self.index = index
+        self.count = count
+
+    def owns(self, url):
+        # hash the host alone, so http and https URLs on the same host belong to the same shard
+        host = urlparse(url).netloc.lower()
+        return zlib.crc32(host.encode('utf-8')) % self.count == self.index
+
+    def filter_records(self, records):
+        """ Return the records with only the links this shard owns, dropping records left without links. """
+        shard_records = []
+        for record in records:
+            links = [link for link in record.links if self.owns(link.url)]
+            if links:
+                shard_record = ElectronicRecord(record.instance_hrid)
+                shard_record.links = links
+                shard_records.append(shard_record)
+        return shard_records
+
+    def filename(self, filename):
+        """ The shard's own version of a file name, e.g. result.csv.gz becomes result.shard-0-of-4.csv.gz. """
+        base, gz = (filename[:-3], '.gz') if filename.endswith('.gz') else (filename, '')
+        base, extension = os.path.splitext(base)
+        return f"{base}.shard-{self.index}-of-{self.count}{extension}{gz}"
@@ -1,10 +1,15 @@
 import requests
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 import urllib.robotparser
 
-from folio_bad_urls.data import ElectronicRecord, TestResult, LocalStatusCode
+from folio_bad_urls.data import TestResult, LocalStatusCode
+from folio_bad_urls.sessions import SessionPool
+from folio_bad_urls.hosts import HostState, parse_retry_after
+from folio_bad_urls.resolver import HostResolver, dead_host_reason
+from folio_bad_urls.metrics import metrics
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
@@ -17,89 +22,177 @@ class WebTester:
         "user-agent": "folio-bad-urls/0.1"
     }
 
-    def __init__(self, config):
+    def __init__(self, config, robots_cache=None):
         self._config = config
         log.addHandler(self._config.log_file_handler)
+        self._robots_cache = robots_cache
 
         self._DEFAULT_CRAWL_DELAY = float(self._config.get('WebTester', 'default_crawl_delay'))
         self._MAX_CRAWL_DELAY = float(self._config.get('WebTester', 'max_crawl_delay'))
         self._REQUEST_TIMEOUT = float(self._config.get('WebTester', 'request_timeout'))
+        self._MAX_WORKERS = int(self._config.get('WebTester', 'max_workers', fallback=10))
+        self._MIN_CRAWL_DELAY = float(self._config.get('WebTester', 'min_crawl_delay', fallback=self._DEFAULT_CRAWL_DELAY))
+        self._CIRCUIT_BREAKER_FAILURES = int(self._config.get('WebTester', 'circuit_breaker_failures', fallback=5))
 
         self._crawl_rules = dict()
         self._last_query_time = dict()
-        self._init_filters()
+        self._host_states = dict()
+        self._sessions = SessionPool(self._config, WebTester.HEADERS)
+        self._resolver = HostResolver(self._config)
 
-    def _init_filters(self):
-        self._allow_list = self._block_list = None
+    def test_url(self, url):
+        """ Test a URL, returning a TestResult without a record. """
 
-        allow_list_string = self._config.get('WebTester', 'allow_list', fallback=None)
-        if allow_list_string:
-            self._allow_list = [val.strip() for val in allow_list_string.split(',')]
-            log.info(f"Using allow list: {self._allow_list}")
-
-        if not self._allow_list:
-            block_list_string = self._config.get('WebTester', 'block_list', fallback=None)
-            if block_list_string:
-                self._block_list = [val.strip() for val in block_list_string.split(',')]
-                log.info(f"Using block list: {self._block_list}")
-
-    def test_record(self, record: ElectronicRecord):
-        url = record.url
+        # skip hosts whose names do not resolve or that refuse connections
+        base_url = self._parse_base_url(url)
+        if self._resolver.is_dead(base_url):
+            log.debug(f"Skipping URL of dead host: {url}")
+            return TestResult(None, url, LocalStatusCode.CONNECTION_FAILED)
 
-        # check local filters
-        if not self._check_filters(url):
-            log.debug(f"Skipping URL due to filters: {url}")
-            return None
+        # skip hosts that keep failing to connect
+        if base_url in self._host_states and self._host_states[base_url].circuit_open:
+            log.debug(f"Skipping URL due to open circuit for its host: {url}")
+            return TestResult(None, url, LocalStatusCode.HOST_CIRCUIT_OPEN)
 
         # check robots.text rules
         rules = self._check_crawl_rules(url)
         if not rules.can_fetch(url):
             log.warn(f"Robots.txt blocks URL: {url}")
-            return TestResult(record.instance_hrid, url, LocalStatusCode.ROBOTS_TXT_BLOCKS_URL)
-        pause_ok = self._pause_if_needed(url, rules)
-        if not pause_ok:
-            return TestResult(record.instance_hrid, url, LocalStatusCode.ROBOTS_TXT_TIMEOUT_EXCESSIVE)
+            return TestResult(None, url, LocalStatusCode.ROBOTS_TXT_BLOCKS_URL)
+        host_state = self._host_state(base_url, rules)
 
-        # load URL and check response
+        # load URL and check response, retrying once if the host asks to slow down
+        for attempt in range(2):
+            pause_ok = self._pause_if_needed(url, rules)
+            if not pause_ok:
+                return TestResult(None, url, LocalStatusCode.ROBOTS_TXT_TIMEOUT_EXCESSIVE)
+            result, throttled = self._test_url_once(url, host_state)
+            if not throttled:
+                break
+        return result
+
+    def _test_url_once(self, url, host_state):
         try:
-            response = requests.get(url, timeout = self._REQUEST_TIMEOUT, headers = WebTester.HEADERS)
+            start = time.time()
+            response = self._request(url)
             status_code = int(response.status_code)
+            throttled = self._is_throttled(response)
+            if throttled:
+                host_state.record_throttled(parse_retry_after(response.headers.get('retry-after')))
+            else:
+                host_state.record_response(time.time() - start)
             last_permanent_redirect = self._get_last_permanent_redirect(response, url)
             log.debug(f"Got status code {status_code} for url {url}")
-            return TestResult(record.instance_hrid, url, status_code, permanent_redirect=last_permanent_redirect)
-        except requests.exceptions.Timeout:
-            log.debug(f"Request timed out for url {url}")
-            return TestResult(record.instance_hrid, url, LocalStatusCode.CONNECTION_FAILED)
+            return TestResult(None, url, status_code, permanent_redirect=last_permanent_redirect), throttled
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            log.debug(f"Could not connect for url {url}: {e}")
+            # count the failure against the host that failed, which may be a redirect target rather than the URL's host
+            failed_base_url = self._failed_base_url(e, url)
+            if failed_base_url == host_state.base_url:
+                host_state.record_connection_failure()
+            else:
+                host_state.record_response(time.time() - start)
+                if failed_base_url in self._host_states:
+                    self._host_states[failed_base_url].record_connection_failure()
+            reason = dead_host_reason(e)
+            if reason:
+                self._resolver.mark_dead(failed_base_url, reason)
+            return TestResult(None, url, LocalStatusCode.CONNECTION_FAILED), False
         except requests.exceptions.RequestException as e:
             log.warn(f"Caught unexpected RequestException with url {url}: {e}")
-            return TestResult(record.instance_hrid, url, LocalStatusCode.CONNECTION_FAILED)
-
-    def _check_filters(self, url):
-        # check allow list
-        if self._allow_list:
-            for pattern in self._allow_list:
-                if pattern in url:
-                    return True
-            return False
-
-        # check block list
-        elif self._block_list:
-            for pattern in self._block_list:
-                if pattern in url:
-                    return False
-
-        # allow URL if it's in neither list
-        return True
+            return TestResult(None, url, LocalStatusCode.CONNECTION_FAILED), False
+
+    def _failed_base_url(self, exception, url):
+        """ The base URL of the request that failed, following any redirects from url. """
+        request = getattr(exception, 'request', None)
+        return self._parse_base_url(request.url if request is not None and request.url else url)
+
+    def _is_throttled(self, response):
+        # a 503 is only a request to slow down if it says when to retry; otherwise the host may simply be down
+        if response.status_code == 429:
+            return True
+        return response.status_code == 503 and 'retry-after' in response.headers
+
+    def _host_state(self, base_url, crawl_rules):
+        if base_url not in self._host_states:
+            # a robots.txt crawl delay replaces the default delay, and the host's delay never adapts below it
+            robots_delay = crawl_rules.crawl_delay()
+            delay = robots_delay if robots_delay else self._DEFAULT_CRAWL_DELAY
+            min_delay = max(self._MIN_CRAWL_DELAY, robots_delay or 0)
+            self._host_states[base_url] = HostState(base_url, delay, min(min_delay, delay),
+                max(self._MAX_CRAWL_DELAY, delay), self._CIRCUIT_BREAKER_FAILURES)
+        return self._host_states[base_url]
+
+    def reset_circuit(self, url):
+        """ Allow one more attempt at the host of a URL skipped because its circuit was open. """
+        base_url = self._parse_base_url(url)
+        if base_url in self._host_states:
+            self._host_states[base_url].reset_circuit()
+
+    def _request(self, url):
+        session = self._sessions.get(self._parse_base_url(url))
+
+        # HEAD avoids downloading the body; fall back to GET when a server rejects or mishandles HEAD
+        with metrics.timer('http_request_seconds', {'method': 'HEAD'}):
+            response = session.head(url, timeout = self._REQUEST_TIMEOUT, allow_redirects = True)
+            response.close()
+        if response.status_code >= 400 and response.status_code != 429:
+            log.debug(f"HEAD returned {response.status_code} for url {url}, retrying with GET")
+            # stream so that only the status and headers are read, then close before the body is downloaded
+            with metrics.timer('http_request_seconds', {'method': 'GET'}):
+                response = session.get(url, timeout = self._REQUEST_TIMEOUT, stream = True)
+                response.close()
+        return response
+
+    def close(self):
+        self._sessions.close()
 
     def _check_crawl_rules(self, url):
         base_url = self._parse_base_url(url)
         if base_url in self._crawl_rules:
             crawl_rules = self._crawl_rules[base_url]
         else:
-            crawl_rules = CrawlRules(base_url)
+            crawl_rules = self._load_crawl_rules(base_url)
             self._crawl_rules[base_url] = crawl_rules
         return crawl_rules
 
+    def prefetch_crawl_rules(self, urls):
+        """ Resolve the hosts of these URLs, then load robots.txt rules concurrently for any live hosts not already loaded. """
+        base_urls = {self._parse_base_url(url) for url in urls} - self._crawl_rules.keys()
+        self._resolver.resolve_all(base_urls)
+        base_urls = {base_url for base_url in base_urls if not self._resolver.is_dead(base_url)}
+        if not base_urls:
+            return
+        log.debug(f"Prefetching robots.txt for {len(base_urls)} hosts.")
+        with ThreadPoolExecutor(max_workers=self._MAX_WORKERS) as executor:
+            for base_url, crawl_rules in zip(base_urls, executor.map(self._load_crawl_rules, base_urls)):
+                self._crawl_rules[base_url] = crawl_rules
+
+    def _load_crawl_rules(self, base_url):
+        with metrics.timer('robots_load_seconds'):
+            robots_txt = self._robots_cache.get(base_url) if self._robots_cache else None
+            if robots_txt:
+                metrics.increment('robots_cache_hits_total')
+            else:
+                robots_txt = self._fetch_robots_txt(base_url)
+                # a server error may be temporary, so do not keep it for the whole robots_ttl_days
+                if robots_txt and self._robots_cache and robots_txt[0] < 500:
+                    self._robots_cache.put(base_url, *robots_txt)
+            return CrawlRules(base_url, robots_txt)
+
+    def _fetch_robots_txt(self, base_url):
+        session = self._sessions.get(base_url)
+        try:
+            response = session.get(base_url + "robots.txt", timeout = self._REQUEST_TIMEOUT)
+            return response.status_code, response.text
+        except requests.exceptions.RequestException as e:
+            log.warn(f"Could not retrieve robots.txt rules for url {base_url}: {e}")
+            reason = dead_host_reason(e) if isinstance(e, requests.exceptions.ConnectionError) else None
+            if reason:
+                # robots.txt may redirect to another host, which is the one that failed
+                self._resolver.mark_dead(self._failed_base_url(e, base_url + "robots.txt"), reason)
+            return None
+
     def _pause_if_needed(self, url, crawl_rules):
         base_url = self._parse_base_url(url)
         if base_url in self._last_query_time:
@@ -107,11 +200,9 @@ class WebTester:
             elapsed = time.time() - server_last_query_time
             log.debug(f"new query to {base_url} after {elapsed}")
 
-            if crawl_rules.crawl_delay():
-                crawl_delay = crawl_rules.crawl_delay()
-                log.debug(f"URL {url} using robots.txt crawl delay: {crawl_delay}")
-            else:
-                crawl_delay = self._DEFAULT_CRAWL_DELAY
+            # starts from the robots.txt or default crawl delay, and adapts to how the host responds
+            crawl_delay = self._host_state(base_url, crawl_rules).delay
+            log.debug(f"URL {url} using crawl delay: {crawl_delay}")
 
             wait_time = crawl_delay - elapsed
             if wait_time > self._MAX_CRAWL_DELAY:
@@ -120,10 +211,22 @@ class WebTester:
 
             if wait_time > 0:
                 log.debug(f"waiting {wait_time:.1f} seconds before next url")
+                metrics.record_crawl_delay_sleep(base_url, wait_time)
                 time.sleep(wait_time)
         self._last_query_time[base_url] = time.time()
         return True
 
+    def next_query_time(self, url):
+        """ The time after which the host of a URL can be queried again without pausing. """
+        base_url = self._parse_base_url(url)
+        if base_url not in self._last_query_time:
+            return 0
+        crawl_delay = self._host_state(base_url, self._check_crawl_rules(url)).delay
+        # a delay beyond max_crawl_delay is not waited out; test_url reports it straight away
+        if crawl_delay > self._MAX_CRAWL_DELAY:
+            return 0
+        return self._last_query_time[base_url] + crawl_delay
+
     def _parse_base_url(self, url):
         parsed_url = urlparse(url)
         base_url = f"{parsed_url.scheme}://{parsed_url.netloc}/"
@@ -141,16 +244,27 @@ class WebTester:
 class CrawlRules:
     """ Report on robots.txt rules for a base URL. """
 
-    def __init__(self, base_url):
+    def __init__(self, base_url, robots_txt):
+        """ robots_txt is the (status_code, body) of the robots.txt response, or None if it could not be retrieved. """
         self._base_url = base_url
         self._robot_parser = urllib.robotparser.RobotFileParser()
         self._robot_parser.set_url(base_url + "robots.txt")
-        try:
-            self._robot_parser.read()
-            self._loaded_rules = True
-        except: 
-            log.warn(f"Could not retrieve robots.txt rules for url {base_url}")
-            self._loaded_rules = False
+        self._loaded_rules = False
+        if not robots_txt:
+            return
+
+        # follow the status code handling of RobotFileParser.read()
+        status_code, body = robots_txt
+        if status_code in (401, 403):
+            self._robot_parser.disallow_all = True
+        elif 400 <= status_code < 500:
+            self._robot_parser.allow_all = True
+        elif status_code >= 500:
+            log.warn(f"Could not retrieve robots.txt rules for url {base_url}: HTTP {status_code}")
+            return
+        else:
+            self._robot_parser.parse(body.splitlines())
+        self._loaded_rules = True
 
     def can_fetch(self, url):
         if self._loaded_rules: